@@ -0,0 +1,341 @@
+"""
+Latency, throughput and peak memory of the API endpoints on synthetic corpora
+
+Drives the FastAPI app in-process through an ASGI transport, or a uvicorn
+server in a subprocess with ``--mode uvicorn``, and reports p50/p95/p99
+latency, requests per second and peak RSS for every endpoint and corpus
+size. Results can be saved as a JSON baseline that later runs are checked
+against. Run from the backend directory:
+
+    python -m benchmarks.bench_api --sizes 100 1000 10000 --output baseline.json
+    python -m benchmarks.bench_api --sizes 100 1000 10000 --compare baseline.json
+
+The status endpoints need the MongoDB at MONGO_URL and only run with
+``--status``. Every corpus is built once per size; 10^5 idioms and more take
+minutes. Peak RSS is that of the process serving the requests, which in
+ASGI mode is the benchmark itself.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import CATEGORIES, DIFFICULTIES, synthetic_entries
+from corpus import CorpusSnapshot
+from snapshot_format import source_digest, write_snapshot
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = [100, 1000, 10000]
+PERCENTILES = (50, 95, 99)
+# A p95 latency or peak RSS this much above the baseline, or a throughput this much below, is a regression
+DEFAULT_TOLERANCE = 0.25
+QUERY_TERMS = 200
+STARTUP_TIMEOUT = 300.0
+
+# method, path, query parameters, JSON body
+Request = Tuple[str, str, Dict[str, str], Optional[dict]]
+
+
+def endpoints(terms: List[str], status: bool) -> Dict[str, Callable[[random.Random], Request]]:
+    """Request generators per benchmarked endpoint, search once per filter mix"""
+
+    def search(query: bool = False, category: bool = False, difficulty: bool = False, fuzzy: bool = False):
+        def request(rng: random.Random) -> Request:
+            params = {}
+            if query:
+                term = rng.choice(terms)
+                # Drop a letter so only the fuzzy fallback finds it
+                params["q"] = term[:-1] if fuzzy and len(term) > 3 else term
+            if fuzzy:
+                params["fuzzy"] = "true"
+            if category:
+                params["category"] = rng.choice(CATEGORIES)
+            if difficulty:
+                params["difficulty"] = rng.choice(DIFFICULTIES)
+            return "GET", "/api/idioms/search", params, None
+        return request
+
+    requests = {
+        "idioms": lambda rng: ("GET", "/api/idioms", {}, None),
+        "idioms page": lambda rng: ("GET", "/api/idioms", {"limit": "50"}, None),
+        "search q": search(query=True),
+        "search q+category": search(query=True, category=True),
+        "search q+difficulty": search(query=True, difficulty=True),
+        "search q+category+difficulty": search(query=True, category=True, difficulty=True),
+        "search category": search(category=True),
+        "search difficulty": search(difficulty=True),
+        "search category+difficulty": search(category=True, difficulty=True),
+        "search fuzzy": search(query=True, fuzzy=True),
+        "categories": lambda rng: ("GET", "/api/categories", {}, None),
+        "stats": lambda rng: ("GET", "/api/stats", {}, None),
+    }
+    if status:
+        requests["status create"] = lambda rng: ("POST", "/api/status", {}, {"client_name": "bench"})
+        requests["status list"] = lambda rng: ("GET", "/api/status", {"limit": "100"}, None)
+    return requests
+
+
+def query_terms(corpus: CorpusSnapshot, seed: int) -> List[str]:
+    """Indexed words of at least four letters, sampled deterministically"""
+    vocab = corpus.search_index.vocab
+    words = [vocab[i] for i in range(len(vocab)) if len(vocab[i]) >= 4] or ["ice"]
+    return random.Random(seed).sample(words, min(QUERY_TERMS, len(words)))
+
+
+class PeakRss:
+    """Peak resident memory of a process, reset between endpoints through /proc on Linux"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def reset(self) -> None:
+        try:
+            with open(f"/proc/{self.pid}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+    def read(self) -> Optional[float]:
+        """Peak RSS in MiB since the last reset, ``None`` if it cannot be read"""
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        if self.pid == os.getpid():
+            # Never reset, so this is the peak of the whole run; bytes on macOS, KiB elsewhere
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+        return None
+
+
+async def measure(
+    client: httpx.AsyncClient,
+    request: Callable[[random.Random], Request],
+    count: int,
+    concurrency: int,
+    rng: random.Random,
+    rss: PeakRss,
+) -> dict:
+    """Send ``count`` requests from ``concurrency`` concurrent clients and summarize them"""
+    latencies: List[float] = []
+    errors = 0
+    received = 0
+    remaining = iter(range(count))
+
+    async def worker():
+        nonlocal errors, received
+        for _ in remaining:
+            method, path, params, body = request(rng)
+            started = time.perf_counter()
+            # Raw bytes: compressed bodies are not decoded, like a proxy passing them through
+            async with client.stream(method, path, params=params, json=body) as response:
+                async for chunk in response.aiter_raw():
+                    received += len(chunk)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    gc.collect()
+    rss.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = (float(value) * 1000 for value in np.percentile(latencies, PERCENTILES))
+    return {
+        "requests": count,
+        "errors": errors,
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+        "rps": round(count / elapsed, 1),
+        "bytes_per_response": round(received / count),
+        "peak_rss_mb": rss.read(),
+    }
+
+
+async def run_endpoints(client: httpx.AsyncClient, corpus: CorpusSnapshot, size: int, rss: PeakRss, args) -> List[dict]:
+    results = []
+    for name, request in endpoints(query_terms(corpus, args.seed), args.status).items():
+        rng = random.Random(args.seed)
+        await measure(client, request, args.warmup, args.concurrency, rng, rss)
+        row = {"size": size, "endpoint": name, **await measure(client, request, args.requests, args.concurrency, rng, rss)}
+        print_row(row)
+        results.append(row)
+    return results
+
+
+def build(size: int) -> CorpusSnapshot:
+    started = time.perf_counter()
+    corpus = CorpusSnapshot.from_entries(synthetic_entries(size))
+    print(f"Built {size} idioms in {time.perf_counter() - started:.1f}s")
+    return corpus
+
+
+async def run_asgi(args) -> List[dict]:
+    """Benchmark the app in this process, swapping in each synthetic corpus"""
+    import server
+
+    results = []
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        if args.status:
+            await server.app.router.startup()
+        try:
+            for size in args.sizes:
+                server.CORPUS = corpus = build(size)
+                results += await run_endpoints(client, corpus, size, PeakRss(os.getpid()), args)
+        finally:
+            if args.status:
+                await server.app.router.shutdown()
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(client: httpx.AsyncClient, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        try:
+            if (await client.get("/api/stats")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not become ready in time")
+
+
+async def run_uvicorn(args) -> List[dict]:
+    """Benchmark a uvicorn server per corpus size, each mapping a prebuilt snapshot"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            source = Path(tmp) / f"idioms-{size}.json"
+            snapshot = Path(tmp) / f"idioms-{size}.snapshot"
+            entries = synthetic_entries(size)
+            source.write_text(json.dumps(entries), encoding="utf-8")
+            corpus = build(size)
+            write_snapshot(corpus, snapshot, source_digest(source))
+            del entries
+
+            port = _free_port()
+            env = dict(os.environ, IDIOMS_FILE=str(source), IDIOMS_SNAPSHOT=str(snapshot))
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+                cwd=BACKEND_DIR,
+                env=env,
+            )
+            try:
+                limits = httpx.Limits(max_connections=args.concurrency)
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=None) as client:
+                    await _wait_ready(client, process)
+                    results += await run_endpoints(client, corpus, size, PeakRss(process.pid), args)
+            finally:
+                process.terminate()
+                process.wait()
+    return results
+
+
+def compare(baseline: dict, results: List[dict], tolerance: float) -> List[str]:
+    """Describe every result worse than its baseline counterpart by more than ``tolerance``"""
+    previous = {(row["size"], row["endpoint"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        base = previous.get((row["size"], row["endpoint"]))
+        if base is None:
+            continue
+        label = f"{row['endpoint']} @ {row['size']}"
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {base['p95_ms']:.2f}ms -> {row['p95_ms']:.2f}ms")
+        if row["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{label}: {base['rps']:.0f} -> {row['rps']:.0f} req/s")
+        if row["peak_rss_mb"] and base["peak_rss_mb"] and row["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{label}: peak RSS {base['peak_rss_mb']:.0f}MB -> {row['peak_rss_mb']:.0f}MB")
+        if row["errors"] > base["errors"]:
+            regressions.append(f"{label}: {base['errors']} -> {row['errors']} errors")
+    return regressions
+
+
+def print_row(row: dict) -> None:
+    rss = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+    print(
+        f"{row['size']:>8} {row['endpoint']:<30} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+        f" {row['rps']:>9.0f} {rss:>8} {row['errors']:>6}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint and size")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests sent first")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--status", action="store_true", help="Also benchmark the MongoDB-backed status endpoints")
+    parser.add_argument("--output", type=Path, help="Save the results as a JSON baseline")
+    parser.add_argument("--results", type=Path, help="Check these saved results instead of running")
+    parser.add_argument("--compare", type=Path, help="Baseline to check the results against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    else:
+        print(f"{'idioms':>8} {'endpoint':<30} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'RSS MB':>8} {'errors':>6}")
+        run = run_asgi if args.mode == "asgi" else run_uvicorn
+        report = {
+            "meta": {
+                "mode": args.mode,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "seed": args.seed,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            },
+            "results": asyncio.run(run(args)),
+        }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {len(report['results'])} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare resident bytes per idiom: pydantic models vs the columnar store
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_memory --sizes 1000 10000 100000
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+import uuid
+
+from pydantic import BaseModel, Field
+
+from benchmarks.synthetic import synthetic_entries
+from store import IdiomStore
+
+
+class PydanticIdiom(BaseModel):
+    """The per-entry model the server used to keep in memory"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    idiom: str
+    meaning: str
+    example: str
+    related_idiom: str
+    difficulty_level: str
+    category: str
+    origin: str
+
+
+def as_pydantic(entries):
+    return [PydanticIdiom(id=str(uuid.uuid4()), **entry) for entry in entries]
+
+
+def as_store(entries):
+    return IdiomStore.from_entries(entries)
+
+
+def retained_bytes(build, raw: str) -> int:
+    """Bytes still allocated after parsing ``raw`` and building from it"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entries = json.loads(raw)
+    result = build(entries)
+    del entries
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'idioms':>8} {'pydantic B/idiom':>18} {'store B/idiom':>15} {'ratio':>7}")
+    for size in args.sizes:
+        raw = json.dumps(synthetic_entries(size))
+        models = retained_bytes(as_pydantic, raw) / size
+        store = retained_bytes(as_store, raw) / size
+        print(f"{size:>8} {models:>18.0f} {store:>15.0f} {models / store:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+CPU per response spent encoding idiom result sets, FastAPI's default path vs the direct one
+
+"validated" is what a route with ``response_model=List[Idiom]`` costs:
+pydantic validation and serialization, ``jsonable_encoder`` and
+``json.dumps``. "default" drops the model but still builds a dict per idiom
+and runs ``jsonable_encoder``. "orjson" encodes the same dicts with orjson
+and no encoder pass, and "direct" is ``encode_records``, which copies whole
+records from the pre-encoded payload. Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --corpus-size 20000 --results 50 1000 10000
+"""
+
+import argparse
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from benchmarks.synthetic import synthetic_entries
+from corpus import CorpusSnapshot
+from pagination import FIELD_PRESETS, projector
+from responses import FastJSONResponse, encode_records
+from server import Idiom
+
+IDIOM_LIST = TypeAdapter(List[Idiom])
+
+
+def validated(corpus, doc_ids, names):
+    content = [projector(names)(corpus.idioms[doc_id]) for doc_id in doc_ids]
+    content = IDIOM_LIST.dump_python(IDIOM_LIST.validate_python(content), mode="json")
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def default(corpus, doc_ids, names):
+    content = [projector(names)(corpus.idioms[doc_id]) for doc_id in doc_ids]
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def orjson_dicts(corpus, doc_ids, names):
+    return FastJSONResponse([projector(names)(corpus.idioms[doc_id]) for doc_id in doc_ids]).body
+
+
+def direct(corpus, doc_ids, names):
+    return encode_records(corpus.idioms, corpus.payload, doc_ids, names)
+
+
+def cpu_ms(fn, corpus, doc_ids, names, min_seconds: float) -> float:
+    """Mean CPU time of one call, repeating until ``min_seconds`` of CPU time were spent"""
+    calls = 0
+    started = time.process_time()
+    while True:
+        fn(corpus, doc_ids, names)
+        calls += 1
+        elapsed = time.process_time() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus-size", type=int, default=20000)
+    parser.add_argument("--results", type=int, nargs="+", default=[50, 1000, 10000])
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="CPU time spent per measurement")
+    args = parser.parse_args()
+
+    corpus = CorpusSnapshot.from_entries(synthetic_entries(args.corpus_size))
+    paths = {"validated": validated, "default": default, "orjson": orjson_dicts, "direct": direct}
+    print(f"{'results':>8} {'fields':>8} " + " ".join(f"{name + ' ms':>13}" for name in paths) + f" {'speedup':>8}")
+    for count in args.results:
+        doc_ids = range(0, len(corpus), max(1, len(corpus) // count))[:count]
+        for label, names in (("all", None), ("summary", FIELD_PRESETS["summary"])):
+            bodies = {name: fn(corpus, doc_ids, names) for name, fn in paths.items() if name != "validated" or names is None}
+            reference = bodies["default"]
+            assert all(body == reference for body in bodies.values() if body is not None)
+            timings = {
+                name: cpu_ms(fn, corpus, doc_ids, names, args.min_seconds) if name in bodies else None
+                for name, fn in paths.items()
+            }
+            cells = " ".join(f"{value:>13.3f}" if value is not None else f"{'-':>13}" for value in timings.values())
+            print(f"{len(doc_ids):>8} {label:>8} {cells} {timings['default'] / timings['direct']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare corpus load time: parsing idioms.json vs mapping the binary snapshot
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup --sizes 1000 10000 100000
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import synthetic_entries
+from corpus import CorpusSnapshot
+from snapshot_format import read_snapshot, source_digest, write_snapshot
+
+
+def load_json(path: Path) -> CorpusSnapshot:
+    with open(path, "r", encoding="utf-8") as f:
+        return CorpusSnapshot.from_entries(json.load(f))
+
+
+def load_snapshot(path: Path, source: Path) -> CorpusSnapshot:
+    return read_snapshot(path, source_digest(source))
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'idioms':>8} {'json load s':>12} {'snapshot load s':>16} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            source = Path(tmp) / f"idioms-{size}.json"
+            target = Path(tmp) / f"idioms-{size}.snapshot"
+            source.write_text(json.dumps(synthetic_entries(size)), encoding="utf-8")
+
+            corpus, json_seconds = timed(load_json, source)
+            write_snapshot(corpus, target, source_digest(source))
+            mapped, snapshot_seconds = timed(load_snapshot, target, source)
+            assert mapped is not None and mapped.version == corpus.version
+            print(f"{size:>8} {json_seconds:>12.3f} {snapshot_seconds:>16.4f} {json_seconds / snapshot_seconds:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
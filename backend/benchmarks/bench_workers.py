@@ -0,0 +1,119 @@
+"""
+Per-worker memory of a multi-worker uvicorn server, private corpus copies vs one shared snapshot
+
+Starts ``uvicorn --workers N`` on a synthetic idioms.json without a
+snapshot, once with every worker building its own corpus and once with
+IDIOMS_SHARED=1, and reads each worker's RSS, PSS and private memory from
+/proc/<pid>/smaps_rollup (Linux only). Run from the backend directory:
+
+    python -m benchmarks.bench_workers --size 100000 --workers 4
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.synthetic import synthetic_entries
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+STARTUP_TIMEOUT = 600.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def worker_pids(pid: int) -> List[int]:
+    """Worker processes of the uvicorn supervisor ``pid``"""
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        children = [int(child) for child in f.read().split()]
+    workers = []
+    for child in children:
+        with open(f"/proc/{child}/cmdline", "rb") as f:
+            if b"resource_tracker" not in f.read():
+                workers.append(child)
+    return workers
+
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if rest.strip().endswith("kB"):
+                values[name] = int(rest.split()[0]) / 1024
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "private": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+
+def run(source: Path, snapshot: Path, workers: int, shared: bool) -> List[Dict[str, float]]:
+    if snapshot.exists():
+        snapshot.unlink()
+    port = _free_port()
+    env = dict(os.environ, IDIOMS_FILE=str(source), IDIOMS_SNAPSHOT=str(snapshot), IDIOMS_SHARED="1" if shared else "0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    started = time.perf_counter()
+    try:
+        # Every worker must have its corpus before memory is read, not just the first to answer
+        while len(worker_pids(process.pid)) < workers or not _all_ready(port, workers):
+            if time.perf_counter() - started > STARTUP_TIMEOUT or process.poll() is not None:
+                raise RuntimeError("uvicorn workers did not become ready")
+            time.sleep(0.5)
+        print(f"{'shared' if shared else 'private'}: {workers} workers ready in {time.perf_counter() - started:.1f}s")
+        return [memory_mb(pid) for pid in worker_pids(process.pid)]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _all_ready(port: int, workers: int) -> bool:
+    """Whether enough requests in a row were answered, spreading them over the workers"""
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            return all(client.get("/api/stats", headers={"Connection": "close"}).status_code == 200 for _ in range(workers * 4))
+    except httpx.TransportError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "idioms.json"
+        source.write_text(json.dumps(synthetic_entries(args.size)), encoding="utf-8")
+        snapshot = Path(tmp) / "idioms.snapshot"
+        results = {shared: run(source, snapshot, args.workers, shared) for shared in (False, True)}
+
+    print(f"{'mode':>8} {'worker':>6} {'RSS MB':>8} {'PSS MB':>8} {'private MB':>11}")
+    for shared, workers in results.items():
+        for number, memory in enumerate(workers):
+            mode = "shared" if shared else "private"
+            print(f"{mode:>8} {number:>6} {memory['rss']:>8.1f} {memory['pss']:>8.1f} {memory['private']:>11.1f}")
+        total = sum(memory["pss"] for memory in workers)
+        print(f"{'':>8} {'total':>6} {'':>8} {total:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
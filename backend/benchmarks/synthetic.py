@@ -0,0 +1,52 @@
+"""
+Deterministic synthetic idiom corpora for benchmarks
+"""
+
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+SEED_FILE = Path(__file__).resolve().parent.parent / "idioms.json"
+
+CATEGORIES = ["Popular", "Education", "General", "Business", "Romantic", "Sports", "Food", "Weather"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+
+
+def _vocabulary() -> List[str]:
+    """Words taken from the real corpus so token statistics look realistic"""
+    words = set()
+    with open(SEED_FILE, encoding="utf-8") as f:
+        for entry in json.load(f):
+            for field in ("idiom", "meaning", "example", "origin"):
+                words.update(word.strip(".,;:!?\"()").lower() for word in entry[field].split())
+    words.discard("")
+    return sorted(words)
+
+
+def _sentence(rng: random.Random, words: List[str], low: int, high: int) -> str:
+    text = " ".join(rng.choice(words) for _ in range(rng.randint(low, high)))
+    return text[0].upper() + text[1:]
+
+
+def synthetic_entries(count: int, seed: int = 42) -> List[Dict[str, str]]:
+    """Return ``count`` raw idiom dicts shaped like idioms.json entries"""
+    rng = random.Random(seed)
+    words = _vocabulary()
+    entries = []
+    seen = set()
+    while len(entries) < count:
+        idiom = _sentence(rng, words, 3, 6)
+        if idiom.lower() in seen:
+            continue
+        seen.add(idiom.lower())
+        entries.append({
+            "idiom": idiom,
+            "meaning": _sentence(rng, words, 6, 12),
+            "example": _sentence(rng, words, 8, 16) + ".",
+            "related_idiom": _sentence(rng, words, 2, 4),
+            "difficulty_level": rng.choice(DIFFICULTIES),
+            "category": rng.choice(CATEGORIES),
+            "origin": _sentence(rng, words, 6, 14),
+        })
+    return entries
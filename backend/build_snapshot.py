@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Compile idioms.json into the binary snapshot the server memory-maps at startup
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from corpus import CorpusSnapshot
+from snapshot_format import read_snapshot, source_digest, write_snapshot
+
+ROOT_DIR = Path(__file__).parent
+
+
+def main():
+    """Build the snapshot and verify it maps back to the same corpus"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--source", type=Path, default=ROOT_DIR / "idioms.json")
+    parser.add_argument("--output", type=Path, default=ROOT_DIR / "idioms.snapshot")
+    parser.add_argument("--brotli-quality", type=int, default=11)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with open(args.source, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    corpus = CorpusSnapshot.from_entries(entries, args.brotli_quality)
+    size = write_snapshot(corpus, args.output, source_digest(args.source))
+    elapsed = time.perf_counter() - started
+
+    mapped = read_snapshot(args.output)
+    if mapped is None or mapped.version != corpus.version or len(mapped) != len(corpus):
+        raise SystemExit("Snapshot verification failed")
+
+    print(f"Compiled {len(corpus)} idioms into {args.output} ({size:,} bytes) in {elapsed:.2f}s")
+    print(f"Corpus version: {corpus.version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Corpus snapshots: the idiom store plus every index derived from it
+"""
+
+from typing import Iterable, List
+
+from facets import FacetIndex
+from fuzzy import TrigramIndex
+from payload import BROTLI_QUALITY, EncodedPayload
+from related import RelatedGraph
+from sampling import RandomSampler
+from search_index import SearchIndex
+from similar import SimilarityIndex
+from store import IdiomStore
+from suggest import SuggestIndex
+
+
+def _facet(store: IdiomStore, field: str) -> FacetIndex:
+    return FacetIndex.from_codes(field, store.code_values[field], store.code_columns[field])
+
+
+class CorpusSnapshot:
+    """The idiom records and every index derived from them, built as a unit
+
+    A snapshot is never mutated after construction. The server publishes a
+    new one by reassigning a single module-level reference and handlers read
+    that reference once per request, so a reload can never expose a
+    half-built state.
+
+    Records are kept sorted by ``(normalized idiom, id)``; positions into
+    ``idioms`` are the doc ids used by the search index, the facets and the
+    pagination cursors.
+    """
+
+    __slots__ = (
+        "idioms", "sort_keys", "search_index", "fuzzy_index", "suggest_index", "related_graph",
+        "similarity_index", "category_facet", "difficulty_facet", "sampler", "payload", "version",
+    )
+
+    def __init__(
+        self,
+        store: IdiomStore,
+        search_index: SearchIndex,
+        fuzzy_index: TrigramIndex,
+        suggest_index: SuggestIndex,
+        related_graph: RelatedGraph,
+        similarity_index: SimilarityIndex,
+        category_facet: FacetIndex,
+        difficulty_facet: FacetIndex,
+        payload: EncodedPayload,
+    ):
+        self.idioms = store
+        self.sort_keys = store.sort_keys
+        self.search_index = search_index
+        self.fuzzy_index = fuzzy_index
+        self.suggest_index = suggest_index
+        self.related_graph = related_graph
+        self.similarity_index = similarity_index
+        self.category_facet = category_facet
+        self.difficulty_facet = difficulty_facet
+        # Cheap enough to rebuild from the facets, so it is not in the binary snapshot
+        self.sampler = RandomSampler(category_facet, difficulty_facet, len(store))
+        self.payload = payload
+        self.version = payload.digest
+
+    @classmethod
+    def from_store(cls, store: IdiomStore, brotli_quality: int = BROTLI_QUALITY) -> "CorpusSnapshot":
+        """Build every derived index for ``store``"""
+        fuzzy_index = TrigramIndex.build(store.keys[i] for i in range(len(store)))
+        return cls(
+            store,
+            search_index=SearchIndex.build(store),
+            fuzzy_index=fuzzy_index,
+            suggest_index=SuggestIndex.build(store),
+            related_graph=RelatedGraph.build(store, fuzzy_index),
+            similarity_index=SimilarityIndex.build(store),
+            category_facet=_facet(store, "category"),
+            difficulty_facet=_facet(store, "difficulty_level"),
+            payload=EncodedPayload.from_records((store.to_dict(i) for i in range(len(store))), brotli_quality),
+        )
+
+    @classmethod
+    def from_entries(cls, entries: List[dict], brotli_quality: int = BROTLI_QUALITY) -> "CorpusSnapshot":
+        return cls.from_store(IdiomStore.from_entries(entries), brotli_quality)
+
+    def apply_delta(self, entries: List[dict], removed_ids: Iterable[str]) -> "CorpusSnapshot":
+        """Return a new snapshot with ``entries`` upserted and ``removed_ids`` dropped
+
+        Only the new records are validated, tokenized and encoded. Every
+        index keeps its existing data, remapped to the new doc ids, and
+        merges in that of the new records. Two shortcuts are only undone by
+        a full build: new BM25F weights use the field-length averages of the
+        last full build, and unresolved references of unchanged idioms are
+        not retried against the new ones. The payload only has its raw
+        body; call ``payload.compress()`` once the snapshot is published.
+        """
+        store, splice = self.idioms.apply_delta(entries, removed_ids)
+        fuzzy_index = self.fuzzy_index.apply(store, splice)
+        return CorpusSnapshot(
+            store,
+            search_index=self.search_index.apply(store, splice),
+            fuzzy_index=fuzzy_index,
+            suggest_index=self.suggest_index.apply(store, splice),
+            related_graph=self.related_graph.apply(store, splice, fuzzy_index),
+            similarity_index=self.similarity_index.apply(store, splice),
+            category_facet=_facet(store, "category"),
+            difficulty_facet=_facet(store, "difficulty_level"),
+            payload=self.payload.splice(splice, [store.to_dict(doc_id) for doc_id in splice.added.tolist()]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.idioms)
@@ -0,0 +1,53 @@
+"""
+Chunked NDJSON and CSV encoders for streaming corpus exports
+"""
+
+import csv
+import io
+from typing import Iterable, Iterator, Sequence
+
+from responses import dumps
+from store import IdiomStore
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+# Records are encoded into chunks of about this size before being sent
+CHUNK_SIZE = 64 * 1024
+
+
+def ndjson_chunks(store: IdiomStore, doc_ids: Iterable[int], fields: Sequence[str]) -> Iterator[bytes]:
+    """Yield one JSON object per line, a chunk at a time"""
+    lines = []
+    size = 0
+    first = True
+    for doc_id in doc_ids:
+        line = dumps({field: store.value(doc_id, field) for field in fields}) + b"\n"
+        lines.append(line)
+        size += len(line)
+        # The first record goes out on its own so the first byte is not held back
+        if size >= CHUNK_SIZE or first:
+            yield b"".join(lines)
+            lines, size, first = [], 0, False
+    if lines:
+        yield b"".join(lines)
+
+
+def csv_chunks(store: IdiomStore, doc_ids: Iterable[int], fields: Sequence[str]) -> Iterator[bytes]:
+    """Yield a header row then one row per idiom, a chunk at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    # The header goes out on its own so the first byte is not held back
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    for doc_id in doc_ids:
+        writer.writerow([store.value(doc_id, field) for field in fields])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
@@ -0,0 +1,80 @@
+"""
+Precomputed facet posting lists for category and difficulty filtering
+"""
+
+from array import array
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+from splice import to_array
+
+
+class FacetIndex:
+    """Sorted doc id arrays for every value of one categorical field
+
+    Values keep the spelling and first-seen order of the corpus; lookups are
+    case-insensitive like the original ``.lower()`` comparisons.
+    """
+
+    def __init__(self, field: str, values: List[str], postings: List[array]):
+        self.field = field
+        self.values = values
+        self.postings = postings
+        self.counts: Dict[str, int] = {value: len(ids) for value, ids in zip(values, postings)}
+        self._slots = {value.casefold(): slot for slot, value in enumerate(values)}
+        self._sets: List[Optional[FrozenSet[int]]] = [None] * len(values)
+
+    @classmethod
+    def from_codes(cls, field: str, code_values: List[str], codes: Sequence[int]) -> "FacetIndex":
+        """Group doc ids by an interned code column without decoding any value"""
+        codes = np.asarray(codes, dtype=np.int64)
+        present, first_seen = np.unique(codes, return_index=True)
+        slots: Dict[str, int] = {}
+        values: List[str] = []
+        slot_of_code = np.zeros(len(code_values), dtype=np.int64)
+        for code in present[np.argsort(first_seen)].tolist():
+            value = code_values[code]
+            slot = slots.setdefault(value.casefold(), len(values))
+            if slot == len(values):
+                values.append(value)
+            slot_of_code[code] = slot
+        doc_slots = slot_of_code[codes]
+        order = np.argsort(doc_slots, kind="stable")
+        bounds = np.searchsorted(doc_slots[order], np.arange(len(values) + 1))
+        postings = [to_array("I", order[bounds[i]:bounds[i + 1]]) for i in range(len(values))]
+        return cls(field, values, postings)
+
+    def slot(self, value: str) -> Optional[int]:
+        """Return the position of ``value`` in ``values``, or ``None`` if unknown"""
+        return self._slots.get(value.casefold())
+
+    def ids(self, value: str) -> Sequence[int]:
+        """Return the ascending doc ids having ``value``, empty if unknown"""
+        slot = self.slot(value)
+        return self.postings[slot] if slot is not None else ()
+
+    def id_set(self, value: str) -> FrozenSet[int]:
+        """Return the doc ids having ``value`` as a set, cached per value"""
+        slot = self.slot(value)
+        if slot is None:
+            return frozenset()
+        cached = self._sets[slot]
+        if cached is None:
+            cached = self._sets[slot] = frozenset(self.postings[slot])
+        return cached
+
+
+def intersect(facet_filters: Sequence[tuple]) -> List[int]:
+    """Intersect ``(facet, value)`` filters into ascending doc ids
+
+    The shortest posting list drives the scan and the others are probed
+    through their cached sets, so cost follows the most selective filter.
+    """
+    postings = sorted(
+        ((facet.ids(value), facet, value) for facet, value in facet_filters),
+        key=lambda item: len(item[0]),
+    )
+    driver, *others = postings
+    other_sets = [facet.id_set(value) for _, facet, value in others]
+    return [doc_id for doc_id in driver[0] if all(doc_id in ids for ids in other_sets)]
@@ -0,0 +1,159 @@
+"""
+Character-trigram index for typo-tolerant idiom lookups
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+from splice import Splice, merge_vocab, splice_postings, splice_strings, to_array
+
+# A candidate must share at least this fraction of the query's trigrams
+MIN_CONTAINMENT = 0.6
+MIN_SIMILARITY = 0.3
+
+
+def trigrams(text: str) -> Set[str]:
+    """Distinct padded trigrams of the normalized text"""
+    normalized = " ".join(tokenize(text))
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Trigram postings over the normalized idiom text of every record
+
+    Stored like ``SearchIndex``: a sorted ``grams`` vocabulary, ``offsets``
+    slicing ascending ``doc_ids``, and ``gram_counts`` holding the number of
+    distinct trigrams per doc for the Dice similarity.
+    """
+
+    def __init__(self, grams: Sequence[str], offsets: Sequence[int], doc_ids: Sequence[int], gram_counts: Sequence[int]):
+        self.grams = grams
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.gram_counts = gram_counts
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "TrigramIndex":
+        postings: Dict[str, List[int]] = {}
+        gram_counts = array("H")
+        for doc_id, text in enumerate(texts):
+            grams = trigrams(text)
+            gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                postings.setdefault(gram, []).append(doc_id)
+
+        vocab = sorted(postings)
+        offsets = array("I", [0])
+        doc_ids = array("I")
+        for gram in vocab:
+            doc_ids.extend(postings[gram])
+            offsets.append(len(doc_ids))
+        return cls(vocab, offsets, doc_ids, gram_counts)
+
+    def apply(self, store, splice: Splice) -> "TrigramIndex":
+        """Index the keys of the docs inserted by ``splice`` and drop the removed ones"""
+        added = TrigramIndex.build(store.keys[doc_id] for doc_id in splice.added.tolist())
+        grams, slots, missing = merge_vocab(self.grams, added.grams)
+        offsets, doc_ids, _ = splice_postings(
+            splice, grams, slots, self.offsets, self.doc_ids, added.offsets, added.doc_ids
+        )
+        return TrigramIndex(
+            splice_strings(self.grams, grams, missing),
+            to_array("I", offsets),
+            to_array("I", doc_ids),
+            to_array("H", splice.gather(self.gram_counts, added.gram_counts, np.uint16)),
+        )
+
+    def _slot(self, gram: str) -> int:
+        slot = bisect_left(self.grams, gram)
+        if slot < len(self.grams) and self.grams[slot] == gram:
+            return slot
+        return -1
+
+    def _contains(self, slot: int, doc_id: int) -> bool:
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        pos = bisect_left(self.doc_ids, doc_id, start, end)
+        return pos < end and self.doc_ids[pos] == doc_id
+
+    def search(
+        self,
+        query: str,
+        min_containment: float = MIN_CONTAINMENT,
+        min_similarity: float = MIN_SIMILARITY,
+        fragments: bool = True,
+        max_scan: Optional[int] = None,
+    ) -> List[Tuple[int, float]]:
+        """Return ``(doc_id, similarity)`` pairs, most similar first
+
+        With ``fragments`` a query fully contained in a longer idiom matches
+        whatever its similarity; without it, docs whose trigram count makes
+        ``min_similarity`` unreachable are skipped before any counting.
+        ``max_scan`` gives up (returns nothing) when the candidate postings
+        are longer than that, for callers that prefer no match to a slow one.
+
+        Uses prefix filtering: a doc sharing at least ``needed`` of the
+        query's ``n`` trigrams must contain one of its ``n - needed + 1``
+        rarest ones, so only those postings are scanned for candidates and
+        the frequent trigrams are just probed for the survivors.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        total = len(query_grams)
+        needed = max(1, math.ceil(total * min_containment))
+
+        slots = []
+        for gram in query_grams:
+            slot = self._slot(gram)
+            if slot >= 0:
+                slots.append(slot)
+        if len(slots) < needed:
+            return []
+        slots.sort(key=lambda s: self.offsets[s + 1] - self.offsets[s])
+
+        # Dice >= s bounds the doc's trigram count m to [n s / (2 - s), n (2 - s) / s]
+        min_grams, max_grams = 0, float("inf")
+        if not fragments:
+            min_grams = total * min_similarity / (2.0 - min_similarity)
+            max_grams = total * (2.0 - min_similarity) / min_similarity
+
+        # Trigrams missing from the corpus count as unmatched
+        prefix_length = len(slots) - needed + 1
+        if max_scan is not None:
+            scan = sum(self.offsets[s + 1] - self.offsets[s] for s in slots[:prefix_length])
+            if scan > max_scan:
+                return []
+        shared: Dict[int, int] = {}
+        gram_counts = self.gram_counts
+        for slot in slots[:prefix_length]:
+            start, end = self.offsets[slot], self.offsets[slot + 1]
+            for doc_id in self.doc_ids[start:end]:
+                if min_grams <= gram_counts[doc_id] <= max_grams:
+                    shared[doc_id] = shared.get(doc_id, 0) + 1
+        remaining = len(slots) - prefix_length
+        for slot in slots[prefix_length:]:
+            # Drop docs that can no longer reach ``needed`` matches
+            shared = {
+                doc_id: count + self._contains(slot, doc_id)
+                for doc_id, count in shared.items()
+                if count + remaining >= needed
+            }
+            remaining -= 1
+
+        scored = []
+        for doc_id, count in shared.items():
+            if count < needed:
+                continue
+            similarity = 2.0 * count / (total + gram_counts[doc_id])
+            if similarity >= min_similarity or (fragments and count == total):
+                scored.append((doc_id, similarity))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored
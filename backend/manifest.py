@@ -0,0 +1,93 @@
+"""
+Per-record content hashes of the idioms file and the deltas between two versions of it
+
+``idioms.manifest.json`` maps the content-addressed id of every idiom in
+idioms.json to a hash of its encoded record, along with the digest of the
+file itself. Re-ingestion compares the new hashes against it and writes
+``idioms.delta.json``: the records added or changed and the ids removed,
+tagged with the digests of the file before and after. A server still
+serving the ``base`` file applies the delta instead of rebuilding.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+RECORD_DIGEST_SIZE = 8
+# Past this share of changed records a full rebuild is about as fast as a delta
+MAX_DELTA_RATIO = 0.5
+
+
+def source_digest(path: Path) -> str:
+    """sha256 of an idioms file, identifying the exact data a corpus was built from"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_hash(encoded: str) -> str:
+    """Short hash of one encoded record"""
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=RECORD_DIGEST_SIZE).hexdigest()
+
+
+def manifest_path(idioms_path) -> Path:
+    return Path(idioms_path).with_name("idioms.manifest.json")
+
+
+def delta_path(idioms_path) -> Path:
+    return Path(idioms_path).with_name("idioms.delta.json")
+
+
+def worth_delta(changes: int, total: int) -> bool:
+    return changes <= MAX_DELTA_RATIO * total
+
+
+def diff_records(old: Dict[str, str], new: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """Ids added or changed in ``new`` and ids only in ``old``, from ``{id: hash}`` maps"""
+    changed = [idiom_id for idiom_id, digest in new.items() if old.get(idiom_id) != digest]
+    removed = [idiom_id for idiom_id in old if idiom_id not in new]
+    return changed, removed
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: Path) -> Optional[dict]:
+    """``{"source_digest": ..., "records": {id: hash}}``, or ``None`` if missing or unreadable"""
+    manifest = _read_json(path)
+    if manifest is None or not isinstance(manifest.get("records"), dict):
+        return None
+    return manifest
+
+
+def write_manifest(path: Path, source: str, records: Dict[str, str]) -> None:
+    _write_json(path, {"source_digest": source, "records": records})
+
+
+def read_delta(path: Path) -> Optional[dict]:
+    """``{"base", "version", "upserts", "removals"}``, or ``None`` if missing or unreadable"""
+    delta = _read_json(path)
+    if delta is None or not all(key in delta for key in ("base", "version", "upserts", "removals")):
+        return None
+    return delta
+
+
+def write_delta(path: Path, base: str, version: str, upserts: List[dict], removals: List[str]) -> None:
+    _write_json(path, {"base": base, "version": version, "upserts": upserts, "removals": removals})
@@ -0,0 +1,243 @@
+"""
+In-process counters, gauges and histograms exposed in the Prometheus text format
+
+Every metric keeps its values in a dict keyed by label values, updated
+under a lock since pymongo reports command timings from its own threads.
+Recording is a few dict operations; the text is only built when /metrics
+is scraped.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(float(4 ** power) for power in range(4, 14))
+COUNT_BUCKETS = (0.0, 1.0, 5.0, 10.0, 50.0, 100.0, 500.0, 1000.0, 5000.0, 10_000.0, 50_000.0, 100_000.0)
+# Label of requests no route matched, so probing random URLs cannot grow the label sets
+UNMATCHED_ROUTE = "<unmatched>"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """One metric family; ``collect`` computes its values at scrape time instead of recording them"""
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.collect = collect
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def _label_text(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """``(suffix, labels, value)`` of every sample"""
+        values = self.collect() if self.collect is not None else self._snapshot()
+        for key, value in values.items():
+            yield "", self._label_text(key), value
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets, plus their sum and count
+
+    Bucket counts are stored per bucket and only made cumulative, as the
+    format requires, when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Bucket counts, the +Inf bucket, then the sum
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, series in self._snapshot().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                yield "_bucket", self._label_text(key, f'le="{_format(bound)}"'), cumulative
+            yield "_sum", self._label_text(key), series[-1]
+            yield "_count", self._label_text(key), cumulative
+
+
+class Registry:
+    """The metrics rendered by one /metrics endpoint, in registration order"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = (), collect=None) -> Counter:
+        return self.register(Counter(name, documentation, labels, collect))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = (), collect=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, collect))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class HttpMetrics:
+    """Request counts, latency, response sizes and in-flight requests by route template"""
+
+    def __init__(self, registry: Registry, prefix: str):
+        self.requests = registry.counter(
+            f"{prefix}_http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")
+        )
+        self.duration = registry.histogram(
+            f"{prefix}_http_request_duration_seconds", "Time to the last response byte", ("method", "route")
+        )
+        self.size = registry.histogram(
+            f"{prefix}_http_response_size_bytes", "Response body size as sent, after compression",
+            ("method", "route"), SIZE_BUCKETS,
+        )
+        self.in_flight = registry.gauge(f"{prefix}_http_requests_in_flight", "HTTP requests being handled")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request into ``HttpMetrics``
+
+    The route label is the path template of the matched route, which the
+    router leaves in the scope, so ``/api/idioms/{idiom_id}`` is one series
+    whatever the id. Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics = self.metrics
+        metrics.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight.dec()
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            labels = (scope["method"], route)
+            metrics.requests.inc(labels + (str(status),))
+            metrics.duration.observe(elapsed, labels)
+            metrics.size.observe(size, labels)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener timing every MongoDB command by name and outcome
+
+    Pass it to the client with ``event_listeners``; it covers Motor calls
+    too since they run on pymongo.
+    """
+
+    def __init__(self, registry: Registry, prefix: str):
+        self.duration = registry.histogram(
+            f"{prefix}_mongo_command_duration_seconds", "MongoDB command round trips", ("command", "outcome")
+        )
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self.duration.observe(event.duration_micros / 1e6, (event.command_name, "success"))
+
+    def failed(self, event) -> None:
+        self.duration.observe(event.duration_micros / 1e6, (event.command_name, "failure"))
@@ -0,0 +1,139 @@
+"""
+MongoDB as the shared source of truth for the idiom corpus
+
+Idioms live in the ``idioms`` collection keyed by their content-addressed
+id with a hash of their content, and a single document in ``idiom_meta``
+carries the version of the collection. Every write replaces the version, so
+workers on any node keep their in-memory corpus and only read the
+collection again when the version they cached is no longer current. A
+write also records which ids it changed, so a worker holding the previous
+version only reads those.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReplaceOne, TEXT
+
+from manifest import record_hash, worth_delta
+from search_index import FIELD_WEIGHTS
+from store import IDIOM_FIELDS, assign_ids, normalize_idiom, validate_entry
+
+META_ID = "corpus"
+LOAD_ATTEMPTS = 3
+LOAD_BATCH_SIZE = 2000
+WRITE_BATCH_SIZE = 1000
+# Keeps the changed ids well inside the 16MB limit of the meta document
+MAX_DELTA_IDS = 100_000
+
+
+def entry_hash(entry: dict) -> str:
+    return record_hash(json.dumps([entry.get(field) for field in IDIOM_FIELDS], ensure_ascii=False))
+
+
+def corpus_version(hashes: Dict[str, str]) -> str:
+    """Digest of the ``{id: content hash}`` of every idiom, independent of their order"""
+    digest = hashlib.sha256()
+    for idiom_id in sorted(hashes):
+        digest.update(f"{idiom_id}:{hashes[idiom_id]}\n".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class MongoIdiomSource:
+    """Read and replace the idiom corpus stored in MongoDB"""
+
+    def __init__(self, db, collection: str = "idioms", meta_collection: str = "idiom_meta"):
+        self.idioms = db[collection]
+        self.meta = db[meta_collection]
+
+    async def ensure_indexes(self) -> None:
+        await self.idioms.create_index([("id", ASCENDING)], name="id", unique=True)
+        await self.idioms.create_index([("key", ASCENDING), ("id", ASCENDING)], name="key_id")
+        await self.idioms.create_index([("category", ASCENDING), ("difficulty_level", ASCENDING)], name="facets")
+        # Weighted like the in-memory BM25F fields, for queries run directly against MongoDB
+        await self.idioms.create_index(
+            [(field, TEXT) for field in FIELD_WEIGHTS],
+            name="text",
+            weights={field: max(1, round(weight * 2)) for field, weight in FIELD_WEIGHTS.items()},
+            default_language="english",
+        )
+
+    async def version(self) -> Optional[str]:
+        """The current corpus version, or ``None`` if nothing was ever written"""
+        meta = await self.meta.find_one({"_id": META_ID}, {"version": 1})
+        return meta["version"] if meta else None
+
+    async def load(self) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """Read every idiom together with the version they belong to
+
+        The version is read before and after the scan; a write publishing a
+        new version in between makes the scan start over.
+        """
+        for _ in range(LOAD_ATTEMPTS):
+            before = await self.version()
+            cursor = self.idioms.find({}, {field: 1 for field in IDIOM_FIELDS} | {"_id": 0})
+            entries = await cursor.sort([("key", ASCENDING), ("id", ASCENDING)]).batch_size(LOAD_BATCH_SIZE).to_list(None)
+            if await self.version() == before:
+                return before, entries
+        raise RuntimeError("Idioms kept changing while they were being loaded")
+
+    async def changes_since(self, base: str) -> Optional[Tuple[str, List[Dict[str, str]], List[str]]]:
+        """``(version, upserted idioms, removed ids)`` of the last write if it started from ``base``
+
+        ``None`` when the last write did not start from ``base``, recorded
+        no changes or was superseded while they were being read; the caller
+        then loads everything.
+        """
+        meta = await self.meta.find_one({"_id": META_ID})
+        if not meta or meta.get("base") != base or meta.get("upserted") is None:
+            return None
+        cursor = self.idioms.find({"id": {"$in": meta["upserted"]}}, {field: 1 for field in IDIOM_FIELDS} | {"_id": 0})
+        entries = await cursor.batch_size(LOAD_BATCH_SIZE).to_list(None)
+        if await self.version() != meta["version"]:
+            return None
+        return meta["version"], entries, meta["removed"]
+
+    async def replace_all(self, entries: List[dict]) -> str:
+        """Make ``entries`` the whole corpus and publish a new version
+
+        Only idioms whose content hash changed are upserted, then idioms no
+        longer present are deleted, so readers never see an empty
+        collection. The changed ids are recorded with the version they
+        apply to unless they are too many to be worth reading on their own.
+        """
+        for position, entry in enumerate(entries):
+            validate_entry(entry, position)
+        documents = [
+            {"id": idiom_id, "key": normalize_idiom(entry["idiom"]), **{f: entry[f] for f in IDIOM_FIELDS if f != "id"}}
+            for idiom_id, entry in zip(assign_ids(entries), entries)
+        ]
+        for document in documents:
+            document["h"] = entry_hash(document)
+        stored = {
+            document["id"]: document.get("h")
+            async for document in self.idioms.find({}, {"id": 1, "h": 1, "_id": 0}).batch_size(LOAD_BATCH_SIZE)
+        }
+        changed = [document for document in documents if stored.get(document["id"]) != document["h"]]
+        hashes = {document["id"]: document["h"] for document in documents}
+        removed = [idiom_id for idiom_id in stored if idiom_id not in hashes]
+
+        for start in range(0, len(changed), WRITE_BATCH_SIZE):
+            batch = changed[start:start + WRITE_BATCH_SIZE]
+            await self.idioms.bulk_write(
+                [ReplaceOne({"id": document["id"]}, document, upsert=True) for document in batch], ordered=False
+            )
+        for start in range(0, len(removed), WRITE_BATCH_SIZE):
+            await self.idioms.delete_many({"id": {"$in": removed[start:start + WRITE_BATCH_SIZE]}})
+
+        base = await self.version()
+        version = corpus_version(hashes)
+        if version == base:
+            return version
+        meta = {"_id": META_ID, "version": version, "count": len(documents), "updated_at": datetime.utcnow()}
+        changes = len(changed) + len(removed)
+        if base is not None and changes <= MAX_DELTA_IDS and worth_delta(changes, len(documents)):
+            meta.update(base=base, upserted=[document["id"] for document in changed], removed=removed)
+        await self.meta.replace_one({"_id": META_ID}, meta, upsert=True)
+        return version
@@ -0,0 +1,107 @@
+"""
+Opaque keyset cursors and field projection for the idiom listing APIs
+"""
+
+import base64
+import json
+import math
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+
+from store import IDIOM_FIELDS
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+SEARCH_MODE_HEADER = "X-Search-Mode"
+DEFAULT_PAGE_SIZE = 50
+FIELD_PRESETS = {
+    "summary": ("id", "idiom", "meaning", "difficulty_level", "category"),
+    "all": IDIOM_FIELDS,
+}
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Pack a keyset position into a URL-safe opaque token"""
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, *keys: str) -> Dict[str, Any]:
+    """Unpack a token from ``encode_cursor``, rejecting anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict) or not all(_valid_field(key, position.get(key)) for key in keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+def _valid_field(key: str, value: Any) -> bool:
+    # "s" is a score, the others are parts of a sort key
+    if key == "s":
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    return isinstance(value, str)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Sequence[str]]:
+    """Resolve a ``fields=`` parameter into field names, ``None`` meaning all"""
+    if not fields:
+        return None
+    preset = FIELD_PRESETS.get(fields.strip().lower())
+    if preset is not None:
+        return preset
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in IDIOM_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in names:
+        names.insert(0, "id")
+    return tuple(dict.fromkeys(names))
+
+
+def projector(names: Optional[Sequence[str]]) -> Callable[[Any], Any]:
+    """Return a function turning an idiom into its projected shape"""
+    if names is None:
+        names = IDIOM_FIELDS
+    return lambda idiom: {name: getattr(idiom, name) for name in names}
+
+
+def paginate_ordered(
+    doc_ids: Sequence[int], sort_keys: Sequence[tuple], cursor: Optional[str],
+    limit: Optional[int], response: Response,
+) -> Sequence[int]:
+    """Slice ascending positions after ``cursor`` and set the next cursor header"""
+    start = 0
+    if cursor:
+        position = decode_cursor(cursor, "k", "i")
+        start = bisect_left(doc_ids, bisect_right(sort_keys, (position["k"], position["i"])))
+    if limit is None:
+        return doc_ids[start:]
+    page = doc_ids[start:start + limit]
+    if page and start + limit < len(doc_ids):
+        key, idiom_id = sort_keys[page[-1]]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"k": key, "i": idiom_id})
+    return page
+
+
+def paginate_ranked(
+    ranked: List[Tuple[int, float]], sort_keys: Sequence[tuple], cursor: Optional[str],
+    limit: Optional[int], response: Response,
+) -> List[int]:
+    """Slice ``(position, score)`` pairs after ``cursor`` by descending score"""
+    start = 0
+    if cursor:
+        position = decode_cursor(cursor, "s", "k", "i")
+        after = (-position["s"], (position["k"], position["i"]))
+        start = bisect_right(ranked, after, key=lambda item: (-item[1], sort_keys[item[0]]))
+    if limit is None:
+        return [doc_id for doc_id, _ in ranked[start:]]
+    page = ranked[start:start + limit]
+    if page and start + limit < len(ranked):
+        doc_id, score = page[-1]
+        key, idiom_id = sort_keys[doc_id]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"s": score, "k": key, "i": idiom_id})
+    return [doc_id for doc_id, _ in page]
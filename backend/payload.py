@@ -0,0 +1,183 @@
+"""
+Response bodies encoded once per corpus version and served with validators
+"""
+
+import gzip
+import hashlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from responses import dumps
+from splice import Splice, to_array
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip and identity still work
+    brotli = None
+
+CACHE_CONTROL = "public, no-cache"
+STREAM_CHUNK_SIZE = 64 * 1024
+# Quality 11 is several times slower than 5 for a few percent of size;
+# runtime builds use the fast setting, offline snapshot builds the best one
+BROTLI_QUALITY = 5
+
+
+def _spans(lengths: np.ndarray) -> array:
+    """Offsets of consecutive records of ``lengths`` bytes after the opening bracket"""
+    spans = np.ones(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=spans[1:])
+    spans[1:] += 1
+    return to_array("I", spans)
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into ``{coding: q}``"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class EncodedPayload:
+    """A JSON body kept as raw, gzip and brotli bytes with strong ETags
+
+    Each representation gets its own strong ETag derived from the raw body
+    hash, so caches never mix compressed and uncompressed variants. Variants
+    may also be memoryviews over a mapped snapshot file; those are streamed
+    in chunks instead of being copied into the worker.
+    """
+
+    def __init__(
+        self,
+        variants: Dict[Optional[str], Any],
+        digest: str,
+        media_type: str = "application/json",
+        spans: Optional[Sequence[int]] = None,
+    ):
+        self.media_type = media_type
+        self.digest = digest
+        self.spans = spans
+        self._set_variants(variants)
+
+    def _set_variants(self, variants: Dict[Optional[str], Any]) -> None:
+        # Tags go first so a concurrent request never negotiates a variant without one
+        self.etags = {
+            coding: f'"{self.digest}-{coding}"' if coding else f'"{self.digest}"'
+            for coding in variants
+        }
+        self._known_etags = set(self.etags.values())
+        self.variants = variants
+
+    @classmethod
+    def encode(cls, body: bytes, brotli_quality: int = BROTLI_QUALITY) -> "EncodedPayload":
+        """Compress ``body`` into every supported encoding"""
+        payload = cls({None: body}, hashlib.sha256(body).hexdigest()[:32])
+        payload.compress(brotli_quality)
+        return payload
+
+    @classmethod
+    def from_records(cls, records: Iterable[Any], brotli_quality: int = BROTLI_QUALITY) -> "EncodedPayload":
+        """Encode a JSON array of ``records``, remembering where each one is
+
+        ``body[spans[i]:spans[i + 1]]`` is record ``i`` and the separator
+        after it, which lets ``splice`` patch the array without re-encoding
+        the records that did not change.
+        """
+        encoded = [dumps(record) for record in records]
+        payload = cls.encode(b"[" + b",".join(encoded) + b"]", brotli_quality)
+        payload.spans = _spans(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)) + 1)
+        return payload
+
+    def splice(self, splice: Splice, records: List[Any]) -> "EncodedPayload":
+        """Apply ``splice`` to the raw array, encoding only the inserted ``records``
+
+        Only the raw body is produced; ``compress`` adds the other encodings.
+        """
+        body, spans = self.variants[None], np.asarray(self.spans, dtype=np.int64)
+        encoded = [dumps(record) + b"," for record in records]
+        lengths = splice.gather(np.diff(spans), [len(record) for record in encoded], np.int64)
+        raw = bytearray(b"[")
+        for from_old, start, end in splice.pieces:
+            raw += body[spans[start]:spans[end]] if from_old else b"".join(encoded[start:end])
+        new_spans = _spans(lengths)
+        if splice.count:
+            # Every record is followed by a comma except the last, followed by the closing bracket
+            separators = np.frombuffer(raw, dtype=np.uint8)
+            separators[np.asarray(new_spans[1:], dtype=np.int64) - 1] = ord(",")
+            separators[-1] = ord("]")
+        else:
+            raw += b"]"
+        raw = bytes(raw)
+        return EncodedPayload({None: raw}, hashlib.sha256(raw).hexdigest()[:32], self.media_type, new_spans)
+
+    def compress(self, brotli_quality: int = BROTLI_QUALITY) -> None:
+        """Add the gzip and brotli encodings of the raw body
+
+        Until then only the raw body is served, which every client accepts.
+        """
+        body = self.variants[None]
+        variants = dict(self.variants)
+        variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=brotli_quality)
+        self._set_variants(variants)
+
+    def _negotiate(self, accept_encoding: str) -> Optional[str]:
+        accepted = _accepted_encodings(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best, best_q = None, 0.0
+        for coding in ("br", "gzip"):
+            if coding not in self.variants:
+                continue
+            q = accepted.get(coding, wildcard)
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def _not_modified(self, if_none_match: str) -> bool:
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in self._known_etags:
+                return True
+        return False
+
+    def respond(self, request: Request) -> Response:
+        """Serve the best encoding for the request, or 304 if it is cached"""
+        coding = self._negotiate(request.headers.get("accept-encoding", ""))
+        headers = {
+            "ETag": self.etags[coding],
+            "Cache-Control": CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if self._not_modified(request.headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=headers)
+        if coding:
+            headers["Content-Encoding"] = coding
+        body = self.variants[coding]
+        if isinstance(body, bytes):
+            return Response(content=body, media_type=self.media_type, headers=headers)
+        headers["Content-Length"] = str(len(body))
+        return StreamingResponse(_chunks(body), media_type=self.media_type, headers=headers)
+
+
+def _chunks(view: memoryview):
+    for start in range(0, len(view), STREAM_CHUNK_SIZE):
+        yield bytes(view[start:start + STREAM_CHUNK_SIZE])
@@ -1,12 +1,28 @@
 #!/usr/bin/env python3
 """
 Populate idioms database with comprehensive data from CSV
-This script processes the provided CSV data and creates a proper JSON file for IdiomFlow
+This script streams CSV or JSON Lines files (or the built-in data below),
+cleans and deduplicates them and writes the idioms.json file for IdiomFlow,
+plus a manifest of per-idiom content hashes and the delta against the
+previous run that lets a running server update without a full rebuild
 """
 
+import argparse
+import asyncio
+import csv
+import io
 import json
-import uuid
-import re
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from manifest import (
+    delta_path, diff_records, manifest_path, read_manifest, record_hash, source_digest, worth_delta, write_delta,
+    write_manifest,
+)
+from store import content_id, normalize_idiom
 
 # The comprehensive CSV data from the user
 csv_data = """Idiom,Meaning,Example,Related Idiom,Difficulty Level,Category,Origin
@@ -76,8 +92,10 @@ def clean_text(text):
     """Clean and normalize text"""
     if not text:
         return ""
-    return text.strip().replace('"', '').replace('"', '').replace('"', '')
+    return text.strip().replace('"', '')
 
+# Few distinct categories, so normalize each spelling once
+@lru_cache(maxsize=1024)
 def normalize_category(category):
     """Normalize category names"""
     category = clean_text(category)
@@ -94,55 +112,144 @@ def normalize_category(category):
     else:
         return category.title()
 
-def parse_csv_data():
-    """Parse the CSV data and create idioms list"""
-    lines = csv_data.strip().split('\n')
-    headers = [h.strip() for h in lines[0].split(',')]
-    
-    idioms = []
-    
-    for line in lines[1:]:
-        if not line.strip():
-            continue
-            
-        # Handle CSV parsing with quotes
-        parts = []
-        in_quotes = False
-        current_part = ""
-        
-        i = 0
-        while i < len(line):
-            char = line[i]
-            if char == '"':
-                in_quotes = not in_quotes
-            elif char == ',' and not in_quotes:
-                parts.append(current_part.strip())
-                current_part = ""
-                i += 1
-                continue
-            
-            current_part += char
-            i += 1
-        
-        if current_part:
-            parts.append(current_part.strip())
-        
-        if len(parts) >= 6:  # Make sure we have enough parts
-            idiom = {
-                "idiom": clean_text(parts[0]),
-                "meaning": clean_text(parts[1]),
-                "example": clean_text(parts[2]),
-                "related_idiom": clean_text(parts[3]),
-                "difficulty_level": clean_text(parts[4]),
-                "category": normalize_category(parts[5]),
-                "origin": clean_text(parts[6]) if len(parts) > 6 else ""
-            }
-            
-            # Skip empty idioms
-            if idiom["idiom"] and idiom["meaning"]:
-                idioms.append(idiom)
-    
-    return idioms
+# CSV headers are matched case-insensitively with spaces or underscores
+FIELDS = ("idiom", "meaning", "example", "related_idiom", "difficulty_level", "category", "origin")
+REQUIRED_COLUMNS = 6
+CHUNK_ROWS = 10000
+# Chunks queued per worker process, enough to keep it busy while the parent writes
+CHUNKS_IN_FLIGHT = 2
+ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+def header_fields(header):
+    """Map CSV header cells to idiom fields, ``None`` for unknown columns"""
+    fields = []
+    for cell in header:
+        name = cell.strip().lower().replace(' ', '_')
+        fields.append(name if name in FIELDS else None)
+    return fields
+
+def clean_row(row):
+    """Turn one raw row (dict or positional list) into an idiom, or ``None`` if it is unusable"""
+    if isinstance(row, dict):
+        row = [row.get(field) or "" for field in FIELDS]
+    elif len(row) < REQUIRED_COLUMNS:
+        return None
+    idiom_text, meaning, example, related, difficulty, category, *rest = row
+    idiom = {
+        "idiom": clean_text(idiom_text),
+        "meaning": clean_text(meaning),
+        "example": clean_text(example),
+        "related_idiom": clean_text(related),
+        "difficulty_level": clean_text(difficulty),
+        "category": normalize_category(category or ""),
+        "origin": clean_text(rest[0]) if rest else "",
+    }
+    # Skip empty idioms
+    if not idiom["idiom"] or not idiom["meaning"]:
+        return None
+    return idiom
+
+def clean_chunk(rows):
+    """Clean and encode a chunk of rows in a worker
+
+    Returns ``(id, content hash, JSON line, category, difficulty)`` per
+    usable row plus the number of rejected rows; strings pickle back to the
+    parent much faster than dicts and leave it only deduplication and writing.
+    """
+    cleaned = []
+    rejected = 0
+    for row in rows:
+        idiom = clean_row(row)
+        if idiom is None:
+            rejected += 1
+        else:
+            line = ENCODER.encode(idiom)
+            cleaned.append((
+                content_id(normalize_idiom(idiom["idiom"])), record_hash(line), line,
+                idiom["category"], idiom["difficulty_level"],
+            ))
+    return cleaned, rejected
+
+def read_csv_rows(f):
+    """Yield rows of a CSV stream as lists ordered like FIELDS
+
+    The csv module handles quoted commas and embedded newlines.
+    """
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = header_fields(header)
+    if "idiom" not in fields:
+        raise ValueError("CSV header has no Idiom column")
+    positions = [fields.index(field) if field in fields else None for field in FIELDS]
+    if positions == list(range(len(FIELDS))):
+        # Columns already in FIELDS order, the common case
+        yield from filter(None, reader)
+        return
+    for row in reader:
+        if len(row) >= REQUIRED_COLUMNS:
+            yield [row[i] if i is not None and i < len(row) else "" for i in positions]
+        elif row:
+            yield row
+
+def read_jsonl_rows(f):
+    """Yield one dict per non-empty line of a JSON Lines stream"""
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+def iter_rows(paths):
+    """Yield raw rows from every input file, or from the built-in data when there are none"""
+    if not paths:
+        yield from read_csv_rows(io.StringIO(csv_data))
+        yield from add_more_educational_idioms()
+        return
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if path.endswith(('.jsonl', '.ndjson')):
+                yield from read_jsonl_rows(f)
+            else:
+                yield from read_csv_rows(f)
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def usable_cpus():
+    """CPUs this process may run on, which a container can set below ``os.cpu_count()``"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def clean_rows(rows, workers):
+    """Yield cleaned chunks in input order, spread over ``workers`` processes
+
+    More processes than usable CPUs only add the cost of pickling rows to
+    them, so ``workers`` is capped at that.
+    """
+    workers = min(workers, usable_cpus())
+    chunks = chunked(rows, CHUNK_ROWS)
+    if workers <= 1:
+        yield from map(clean_chunk, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Results come back in input order, so deduplication always keeps the
+        # first occurrence; only a few chunks are submitted ahead so the input
+        # is read no faster than it is written
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(clean_chunk, chunk))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 def add_more_educational_idioms():
     """Add more educational and diverse idioms"""
@@ -286,43 +393,143 @@ def add_more_educational_idioms():
     
     return additional_idioms
 
-def main():
-    """Main function to create the comprehensive idioms JSON file"""
-    print("Parsing CSV data...")
-    idioms = parse_csv_data()
-    
-    print("Adding additional educational idioms...")
-    idioms.extend(add_more_educational_idioms())
-    
-    print(f"Total idioms processed: {len(idioms)}")
-    
-    # Create the final JSON structure
-    final_idioms = []
-    for idiom in idioms:
-        final_idioms.append({
-            "idiom": idiom["idiom"],
-            "meaning": idiom["meaning"],
-            "example": idiom["example"],
-            "related_idiom": idiom["related_idiom"],
-            "difficulty_level": idiom["difficulty_level"],
-            "category": idiom["category"],
-            "origin": idiom["origin"]
-        })
-    
-    # Write to JSON file
-    with open('/app/backend/idioms.json', 'w', encoding='utf-8') as f:
-        json.dump(final_idioms, f, indent=2, ensure_ascii=False)
-    
-    print(f"Successfully created idioms.json with {len(final_idioms)} idioms")
+async def publish_to_mongo(idioms):
+    """Replace the idioms collection so servers with IDIOMS_BACKEND=mongo pick them up"""
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from mongo_idioms import MongoIdiomSource
+
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        source = MongoIdiomSource(client[os.environ['DB_NAME']])
+        await source.ensure_indexes()
+        version = await source.replace_all(idioms)
+    finally:
+        client.close()
+    print(f"Published {len(idioms)} idioms to MongoDB, version {version}")
+
+class IdiomWriter:
+    """Write idioms to a temporary file as they arrive, then move it into place
+
+    JSON output is an array with one idiom per line, so the file can be
+    streamed out without holding the corpus in memory and still diffs well.
+    The rename means a running server that watches idioms.json never reads
+    a half-written file; ``close`` finishes the temporary file and
+    ``commit`` or ``discard`` decides its fate.
+    """
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.format = fmt
+        self.count = 0
+        self.file = open(path + '.tmp', 'w', encoding='utf-8')
+        if fmt == 'json':
+            self.file.write('[')
+
+    def write_many(self, lines):
+        """Append already encoded idioms"""
+        if not lines:
+            return
+        if self.format == 'json':
+            self.file.write(('\n' if self.count == 0 else ',\n') + ',\n'.join(lines))
+        else:
+            self.file.write('\n'.join(lines) + '\n')
+        self.count += len(lines)
+
+    def close(self):
+        if self.format == 'json':
+            self.file.write('\n]\n')
+        self.file.close()
+        return self.path + '.tmp'
+
+    def commit(self):
+        os.replace(self.path + '.tmp', self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.path + '.tmp')
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Ingest idioms from CSV or JSON Lines files into idioms.json")
+    parser.add_argument('inputs', nargs='*', help="CSV or .jsonl files; the built-in data when omitted")
+    parser.add_argument('--output', help="Defaults to idioms.json, or idioms.jsonl with --format jsonl, next to this script")
+    parser.add_argument('--format', choices=('json', 'jsonl'), default='json', help="Output format")
+    parser.add_argument('--workers', type=int, default=min(8, usable_cpus()),
+                        help="Processes cleaning rows; 1 cleans in this process")
+    parser.add_argument('--mongo', action='store_true', help="Also publish the idioms to MongoDB")
+    args = parser.parse_args(argv)
+    if args.output is None:
+        # The server only reads the JSON array, so JSON Lines must not land in its idioms.json
+        args.output = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'idioms.{args.format}')
+    return args
+
+def publish_delta(output, manifest, records, changed, source):
+    """Write the delta from the previous run's file to the new one, if it is worth applying"""
+    path = delta_path(output)
+    if manifest is not None:
+        upserted, removed = diff_records(manifest["records"], records)
+        if worth_delta(len(upserted) + len(removed), len(records)):
+            write_delta(path, manifest["source_digest"], source, [json.loads(line) for line in changed], removed)
+            print(f"Delta: {len(upserted)} added or changed, {len(removed)} removed")
+            return
+    if path.exists():
+        path.unlink()
+
+def main(argv=None):
+    """Stream, clean and deduplicate the input idioms into the output file"""
+    args = parse_args(argv)
+    started = time.perf_counter()
+    print(f"Reading {', '.join(args.inputs) or 'built-in idioms'}...")
     
-    # Print statistics
+    manifest = read_manifest(manifest_path(args.output)) if os.path.exists(args.output) else None
+    previous = manifest["records"] if manifest is not None else None
+    records = {}
+    changed = []
+    read = rejected = duplicates = 0
     categories = {}
     difficulties = {}
-    for idiom in final_idioms:
-        cat = idiom["category"]
-        diff = idiom["difficulty_level"]
-        categories[cat] = categories.get(cat, 0) + 1
-        difficulties[diff] = difficulties.get(diff, 0) + 1
+    published = [] if args.mongo else None
+    writer = IdiomWriter(args.output, args.format)
+    try:
+        for cleaned, chunk_rejected in clean_rows(iter_rows(args.inputs), args.workers):
+            read += len(cleaned) + chunk_rejected
+            rejected += chunk_rejected
+            fresh = []
+            for idiom_id, digest, line, category, difficulty in cleaned:
+                # Same identity rule as the server's content-addressed ids
+                if idiom_id in records:
+                    duplicates += 1
+                    continue
+                records[idiom_id] = digest
+                fresh.append(line)
+                if previous is not None and previous.get(idiom_id) != digest:
+                    changed.append(line)
+                categories[category] = categories.get(category, 0) + 1
+                difficulties[difficulty] = difficulties.get(difficulty, 0) + 1
+            writer.write_many(fresh)
+            if published is not None:
+                published.extend(map(json.loads, fresh))
+    except BaseException:
+        writer.discard()
+        raise
+    source = source_digest(writer.close())
+    elapsed = time.perf_counter() - started
+    
+    print(f"Read {read} rows in {elapsed:.2f}s ({read / elapsed if elapsed else 0:,.0f} rows/s)")
+    if manifest is not None and manifest["source_digest"] == source:
+        # Leave the file untouched so servers watching it do not reload
+        writer.discard()
+        print(f"{args.output} is unchanged, {writer.count} idioms")
+    else:
+        # The delta goes first so a server reloading on the new file always finds it
+        publish_delta(args.output, manifest, records, changed, source)
+        writer.commit()
+        write_manifest(manifest_path(args.output), source, records)
+        print(f"Wrote {writer.count} idioms to {args.output}, skipped {duplicates} duplicates and {rejected} invalid rows")
+    
+    if published is not None:
+        asyncio.run(publish_to_mongo(published))
     
     print("\nCategories:")
     for cat, count in sorted(categories.items()):
@@ -0,0 +1,211 @@
+"""
+On-demand sampling profiler for individual requests
+
+A profiled request registers the frame of the middleware handling it; a
+background thread then samples the stack of the thread running it every
+``interval`` seconds and keeps the part below that frame, so concurrent
+requests on the same event loop are told apart. Samples taken while the
+request is suspended (awaiting MongoDB, or another request holding the
+loop) are counted as ``(waiting)``. Profiles are kept as collapsed stacks,
+the input format of flamegraph.pl and speedscope, and aggregated into
+hot-function tables over a rolling window. Work handed to other threads
+with ``asyncio.to_thread`` is not sampled, and the sampler needs the GIL,
+so it cannot sample more often than ``sys.getswitchinterval()`` while the
+request holds it.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+ADMIN_TOKEN_HEADER = "x-admin-token"
+WAITING = "(waiting)"
+
+Stack = Tuple[str, ...]
+
+
+class Profile:
+    """Stack samples of one request"""
+
+    def __init__(self, method: str, path: str, thread_id: int, anchor):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.duration = 0.0
+        self.status = None
+        self.samples: Counter = Counter()
+        self.thread_id = thread_id
+        self.anchor = anchor
+
+    def collapsed(self) -> str:
+        """One ``frame;frame;frame count`` line per distinct stack, outermost frame first"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": sum(self.samples.values()),
+        }
+
+
+class Profiler:
+    """Samples the active profiles from one background thread and keeps the finished ones
+
+    The thread only runs while at least one request is being profiled.
+    """
+
+    def __init__(self, interval: float = 0.005, history: int = 500):
+        self.interval = interval
+        self.history = history
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._active: List[Profile] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+
+    def start(self, method: str, path: str, anchor) -> Profile:
+        profile = Profile(method, path, threading.get_ident(), anchor)
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return profile
+
+    def finish(self, profile: Profile, duration: float, status: Optional[int]) -> None:
+        with self._lock:
+            self._active.remove(profile)
+            if not self._active:
+                self._wake.clear()
+            profile.anchor = None
+            profile.duration = duration
+            profile.status = status
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > self.history:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self.profiles.get(profile_id)
+
+    def recent(self, limit: int) -> List[Profile]:
+        with self._lock:
+            return list(self.profiles.values())[-limit:][::-1]
+
+    def hot_functions(self, window: float, limit: int) -> Dict:
+        """Functions with the most samples across the profiles finished in the last ``window`` seconds
+
+        ``self`` counts samples with the function on top of the stack,
+        ``total`` samples with it anywhere on the stack.
+        """
+        since = time.time() - window
+        with self._lock:
+            profiles = [profile for profile in self.profiles.values() if profile.started >= since]
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for profile in profiles:
+            for stack, count in profile.samples.items():
+                own[stack[-1]] += count
+                for function in set(stack):
+                    total[function] += count
+        samples = sum(own.values())
+        return {
+            "profiles": len(profiles),
+            "samples": samples,
+            "functions": [
+                {
+                    "function": function,
+                    "self": count,
+                    "total": total[function],
+                    "self_share": round(count / samples, 4),
+                }
+                for function, count in own.most_common(limit)
+            ],
+        }
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()
+        with self._lock:
+            for profile in self._active:
+                frame = frames.get(profile.thread_id)
+                codes = []
+                while frame is not None and frame is not profile.anchor:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if frame is None:
+                    stack: Stack = (WAITING,)
+                else:
+                    stack = tuple(self._label(code) for code in reversed(codes)) or (WAITING,)
+                profile.samples[stack] += 1
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            self._sample()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests on demand
+
+    A request is profiled when it carries ``X-Profile: 1`` together with
+    the admin token, or at random with probability ``sample_rate``. The
+    response of a profiled request names its profile in ``X-Profile-Id``.
+    """
+
+    def __init__(self, app, profiler: Profiler, admin_token: Optional[str], sample_rate: float = 0.0):
+        self.app = app
+        self.profiler = profiler
+        self.admin_token = admin_token.encode("latin-1") if admin_token else None
+        self.sample_rate = sample_rate
+
+    def _wanted(self, scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if self.admin_token is None:
+            return False
+        headers = dict(scope["headers"])
+        return headers.get(PROFILE_HEADER.encode()) == b"1" and headers.get(ADMIN_TOKEN_HEADER.encode()) == self.admin_token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.start(scope["method"], scope["path"], sys._getframe())
+        status = None
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.lower().encode(), profile.id.encode())
+                ]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.profiler.finish(profile, time.perf_counter() - started, status)
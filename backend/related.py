@@ -0,0 +1,112 @@
+"""
+Related-idiom graph resolved from the free-text ``related_idiom`` field
+"""
+
+from array import array
+from collections import deque
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from fuzzy import TrigramIndex
+from splice import Splice, to_array
+from store import content_id, normalize_idiom
+
+# Fuzzy references must cover nearly all of the trigrams of the reference
+# text and be close overall, so "Sharp as a tack" never links to "Tack on"
+FUZZY_MIN_CONTAINMENT = 0.8
+FUZZY_MIN_SIMILARITY = 0.75
+# References made only of common trigrams are ambiguous; skip rather than scan
+FUZZY_MAX_SCAN = 256
+MAX_DEPTH = 3
+NO_TARGET = 0xFFFFFFFF
+
+
+def _resolve(store, fuzzy_index: TrigramIndex, doc_id: int) -> int:
+    """The doc named by the ``related_idiom`` of ``doc_id``, or ``NO_TARGET``"""
+    reference = store.value(doc_id, "related_idiom")
+    key = normalize_idiom(reference)
+    if not key:
+        return NO_TARGET
+    target = store.find(content_id(key))
+    if target is None:
+        matches = fuzzy_index.search(
+            reference, FUZZY_MIN_CONTAINMENT, FUZZY_MIN_SIMILARITY,
+            fragments=False, max_scan=FUZZY_MAX_SCAN,
+        )
+        if matches:
+            target = matches[0][0]
+    return NO_TARGET if target is None or target == doc_id else target
+
+
+class RelatedGraph:
+    """Undirected adjacency over doc ids in compressed sparse row form
+
+    ``neighbors[offsets[d]:offsets[d + 1]]`` are the docs linked to ``d``,
+    either because one names the other in ``related_idiom`` or the reverse.
+    ``targets[d]`` is the doc that ``d`` itself names (``NO_TARGET`` if
+    none), which is what the adjacency is derived from.
+    """
+
+    def __init__(self, targets: Sequence[int], offsets: Sequence[int], neighbors: Sequence[int]):
+        self.targets = targets
+        self.offsets = offsets
+        self.neighbors = neighbors
+
+    @classmethod
+    def build(cls, store, fuzzy_index: TrigramIndex) -> "RelatedGraph":
+        """Resolve every reference by exact normalized id, then by trigram similarity"""
+        return cls.from_targets(array("I", (_resolve(store, fuzzy_index, doc_id) for doc_id in range(len(store)))))
+
+    @classmethod
+    def from_targets(cls, targets: Sequence[int]) -> "RelatedGraph":
+        """Link every doc with the doc it names, in both directions"""
+        named = np.asarray(targets, dtype=np.int64)
+        doc_count = len(named)
+        sources = np.flatnonzero(named != NO_TARGET)
+        linked = np.unique(np.concatenate((
+            sources * doc_count + named[sources],
+            named[sources] * doc_count + sources,
+        )))
+        offsets = np.zeros(doc_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(linked // doc_count, minlength=doc_count), out=offsets[1:])
+        return cls(targets, to_array("I", offsets), to_array("I", linked % doc_count if doc_count else linked))
+
+    def apply(self, store, splice: Splice, fuzzy_index: TrigramIndex) -> "RelatedGraph":
+        """Resolve the references of the docs inserted by ``splice`` and of those naming a removed doc
+
+        References of unchanged docs that did not resolve before are not
+        retried, so they only pick up newly added idioms on a full build.
+        """
+        named = np.asarray(self.targets, dtype=np.int64)
+        resolved = named != NO_TARGET
+        # -1 marks a reference whose target was removed
+        named[resolved] = splice.old_to_new[named[resolved]]
+        targets = splice.gather(named, [_resolve(store, fuzzy_index, doc_id) for doc_id in splice.added.tolist()], np.int64)
+        for doc_id in np.flatnonzero(targets < 0).tolist():
+            targets[doc_id] = _resolve(store, fuzzy_index, doc_id)
+        return RelatedGraph.from_targets(to_array("I", targets))
+
+    def neighbors_of(self, doc_id: int) -> Sequence[int]:
+        return self.neighbors[self.offsets[doc_id]:self.offsets[doc_id + 1]]
+
+    def traverse(self, doc_id: int, depth: int, limit: int) -> List[Tuple[int, int]]:
+        """Breadth-first ``(doc_id, depth)`` pairs reachable within ``depth`` hops"""
+        depth = min(depth, MAX_DEPTH)
+        visited: Dict[int, int] = {doc_id: 0}
+        queue = deque([doc_id])
+        found: List[Tuple[int, int]] = []
+        while queue and len(found) < limit:
+            current = queue.popleft()
+            hops = visited[current] + 1
+            if hops > depth:
+                break
+            for neighbor in self.neighbors_of(current):
+                if neighbor in visited:
+                    continue
+                visited[neighbor] = hops
+                found.append((neighbor, hops))
+                queue.append(neighbor)
+                if len(found) >= limit:
+                    break
+        return found
@@ -0,0 +1,76 @@
+"""
+JSON responses encoded straight to bytes, without FastAPI's jsonable_encoder pass
+
+Handlers returning a ``Response`` skip both ``jsonable_encoder`` and
+``response_model`` validation. Whole idiom records are not encoded at all:
+they are sliced out of the pre-encoded /api/idioms body. Validation can be
+switched back on for debugging with a pydantic ``TypeAdapter`` check on the
+encoded body.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Optional, Sequence
+
+from starlette.responses import JSONResponse, Response
+
+from store import IDIOM_FIELDS
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library encoder still works
+    orjson = None
+
+
+def _default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, datetimes in ISO 8601 like FastAPI's encoder"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(body: bytes, response: Optional[Response] = None, check=None) -> Response:
+    """Serve an encoded JSON body, keeping the headers set on the injected ``response``
+
+    ``check`` is a ``TypeAdapter`` the body is validated against first.
+    """
+    if check is not None:
+        check.validate_json(body)
+    result = Response(body, media_type="application/json")
+    if response is not None:
+        result.headers.raw.extend(header for header in response.headers.raw if header[0] != b"content-length")
+    return result
+
+
+def encode_record(store, payload, doc_id: int, names: Optional[Sequence[str]] = None) -> bytes:
+    """JSON object of the record at ``doc_id``, like one element of ``encode_records``"""
+    if names is None and payload.spans is not None:
+        spans = payload.spans
+        return bytes(payload.variants[None][spans[doc_id]:spans[doc_id + 1] - 1])
+    return dumps({name: store.value(doc_id, name) for name in names or IDIOM_FIELDS})
+
+
+def encode_records(store, payload, doc_ids: Iterable[int], names: Optional[Sequence[str]] = None) -> bytes:
+    """JSON array of the records at ``doc_ids``, projected to ``names`` when given
+
+    Whole records are copied from ``payload``, whose spans locate every
+    record; projections are encoded from the store in one call.
+    """
+    if names is None and payload.spans is not None:
+        body, spans = payload.variants[None], payload.spans
+        return b"[" + b",".join(body[spans[doc_id]:spans[doc_id + 1] - 1] for doc_id in doc_ids) + b"]"
+    names = names or IDIOM_FIELDS
+    return dumps([{name: store.value(doc_id, name) for name in names} for doc_id in doc_ids])
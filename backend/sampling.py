@@ -0,0 +1,165 @@
+"""
+Constant-time weighted random sampling over the category/difficulty facets
+"""
+
+import random
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from facets import FacetIndex
+
+# Tables for custom weights are built on demand; keep the most recent ones
+WEIGHTED_CACHE_SIZE = 256
+
+
+def parse_weights(weights: Optional[str], known_values: Iterable[str]) -> Optional[Dict[str, float]]:
+    """Parse ``"Easy:3,Hard:0.5"`` into ``{value: weight}``, raising 400 on bad input"""
+    if not weights:
+        return None
+    known = {value.casefold() for value in known_values}
+    parsed = {}
+    for part in weights.split(","):
+        value, sep, weight = part.rpartition(":")
+        value = value.strip()
+        try:
+            number = float(weight)
+        except ValueError:
+            number = -1.0
+        if not sep or not value or not number >= 0 or number == float("inf"):
+            raise HTTPException(status_code=400, detail=f"Invalid weight '{part.strip()}', expected value:number")
+        if value.casefold() not in known:
+            raise HTTPException(status_code=400, detail=f"Unknown category or difficulty '{value}'")
+        parsed[value] = number
+    return parsed
+
+
+class AliasTable:
+    """Vose's alias method: O(n) to build, one uniform draw per sample"""
+
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("Alias table needs a positive total weight")
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is 1.0 up to rounding and keeps prob = 1
+
+    def sample(self, rng: random.Random) -> int:
+        u = rng.random() * len(self.prob)
+        slot = int(u)
+        return slot if u - slot < self.prob[slot] else self.alias[slot]
+
+
+class RandomSampler:
+    """Docs grouped into one bucket per (category, difficulty) pair
+
+    An alias table over the matching buckets, weighted by their size, is
+    precomputed for every filter combination, so a uniform draw is one
+    alias lookup plus one index into the bucket. Custom weights multiply a
+    bucket's size by the weight of its category and of its difficulty and
+    get their own (small, cached) table.
+    """
+
+    def __init__(self, category_facet: FacetIndex, difficulty_facet: FacetIndex, doc_count: int):
+        self.category_facet = category_facet
+        self.difficulty_facet = difficulty_facet
+        n_categories = len(category_facet.values)
+        n_difficulties = len(difficulty_facet.values)
+
+        category_of = np.zeros(doc_count, dtype=np.int64)
+        for slot, ids in enumerate(category_facet.postings):
+            category_of[np.asarray(ids, dtype=np.int64)] = slot
+        difficulty_of = np.zeros(doc_count, dtype=np.int64)
+        for slot, ids in enumerate(difficulty_facet.postings):
+            difficulty_of[np.asarray(ids, dtype=np.int64)] = slot
+        bucket_of = category_of * n_difficulties + difficulty_of
+        self.docs = np.argsort(bucket_of, kind="stable").astype(np.uint32)
+        sizes = np.bincount(bucket_of, minlength=n_categories * n_difficulties)
+        self.offsets = np.concatenate(([0], np.cumsum(sizes))).tolist()
+
+        self.buckets: Dict[Tuple[Optional[int], Optional[int]], Tuple[Sequence[int], Sequence[int]]] = {}
+        self.tables: Dict[Tuple[Optional[int], Optional[int]], AliasTable] = {}
+        for category in [None, *range(n_categories)]:
+            for difficulty in [None, *range(n_difficulties)]:
+                buckets = [
+                    c * n_difficulties + d
+                    for c in (range(n_categories) if category is None else (category,))
+                    for d in (range(n_difficulties) if difficulty is None else (difficulty,))
+                    if sizes[c * n_difficulties + d]
+                ]
+                if buckets:
+                    self.buckets[category, difficulty] = (
+                        buckets,
+                        [(b // n_difficulties, b % n_difficulties) for b in buckets],
+                    )
+                    self.tables[category, difficulty] = AliasTable([int(sizes[b]) for b in buckets])
+        self._weighted: Dict[tuple, Optional[AliasTable]] = {}
+
+    def _slot(self, facet: FacetIndex, value: Optional[str]) -> Optional[int]:
+        if not value:
+            return None
+        slot = facet.slot(value)
+        if slot is None:
+            raise KeyError(value)
+        return slot
+
+    def sample(
+        self,
+        rng: random.Random,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> Optional[int]:
+        """Draw one doc id matching the filters, or ``None`` if nothing matches
+
+        ``weights`` maps category or difficulty values to relative weights;
+        values that are not listed weigh 1.
+        """
+        try:
+            key = (self._slot(self.category_facet, category), self._slot(self.difficulty_facet, difficulty))
+        except KeyError:
+            return None
+        entry = self.buckets.get(key)
+        if entry is None:
+            return None
+        buckets, pairs = entry
+        table = self.tables[key]
+        if weights:
+            table = self._weighted_table(key, buckets, pairs, weights)
+            if table is None:
+                return None
+
+        bucket = buckets[table.sample(rng)]
+        start, end = self.offsets[bucket], self.offsets[bucket + 1]
+        return int(self.docs[start + int(rng.random() * (end - start))])
+
+    def _weighted_table(self, key, buckets, pairs, weights) -> Optional[AliasTable]:
+        folded = {value.casefold(): weight for value, weight in weights.items()}
+        cache_key = (key, tuple(sorted(folded.items())))
+        if cache_key in self._weighted:
+            return self._weighted[cache_key]
+        bucket_weights = [
+            (self.offsets[b + 1] - self.offsets[b])
+            * folded.get(self.category_facet.values[c].casefold(), 1.0)
+            * folded.get(self.difficulty_facet.values[d].casefold(), 1.0)
+            for b, (c, d) in zip(buckets, pairs)
+        ]
+        table = AliasTable(bucket_weights) if sum(bucket_weights) > 0 else None
+        if len(self._weighted) >= WEIGHTED_CACHE_SIZE:
+            del self._weighted[next(iter(self._weighted))]
+        self._weighted[cache_key] = table
+        return table
@@ -0,0 +1,218 @@
+"""
+Inverted index over the idiom text fields with BM25F relevance ranking
+"""
+
+import math
+import re
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from splice import Splice, merge_vocab, splice_postings, splice_strings, to_array
+
+# Fields that are indexed for full-text search and their BM25F weights
+SEARCH_FIELDS = ("idiom", "meaning", "example", "origin")
+FIELD_WEIGHTS = {"idiom": 3.0, "meaning": 1.5, "example": 1.0, "origin": 0.5}
+FIELD_B = 0.75
+K1 = 1.2
+
+# The last query token is also matched as a prefix so partial words still work
+PREFIX_EXPANSION_LIMIT = 64
+PREFIX_PENALTY = 0.8
+
+_TOKEN_RE = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens, folding apostrophes into the word"""
+    if not text:
+        return []
+    return [
+        token.replace("'", "").replace("’", "")
+        for token in _TOKEN_RE.findall(text.casefold())
+    ]
+
+
+def _field_tokens(record) -> Tuple[List[str], ...]:
+    return tuple(tokenize(getattr(record, field)) for field in SEARCH_FIELDS)
+
+
+def _postings(
+    field_tokens: List[Tuple[List[str], ...]], avg_lengths: Dict[str, float]
+) -> Tuple[List[str], array, array, array]:
+    """Build the sorted vocabulary and flat postings of the tokenized docs"""
+    postings: Dict[str, Dict[int, float]] = {}
+    for doc_id, tokens in enumerate(field_tokens):
+        for field, field_tokens_ in zip(SEARCH_FIELDS, tokens):
+            if not field_tokens_:
+                continue
+            norm = 1.0 - FIELD_B + FIELD_B * len(field_tokens_) / avg_lengths[field]
+            boost = FIELD_WEIGHTS[field] / norm
+            for token in field_tokens_:
+                doc_scores = postings.setdefault(token, {})
+                doc_scores[doc_id] = doc_scores.get(doc_id, 0.0) + boost
+
+    vocab = sorted(postings)
+    offsets = array("I", [0])
+    doc_ids = array("I")
+    weights = array("f")
+    for term in vocab:
+        for doc_id, pseudo_tf in sorted(postings[term].items()):
+            doc_ids.append(doc_id)
+            weights.append(pseudo_tf / (K1 + pseudo_tf))
+        offsets.append(len(doc_ids))
+    return vocab, offsets, doc_ids, weights
+
+
+class SearchIndex:
+    """Immutable inverted index built once per corpus load
+
+    Postings are stored flat: ``vocab`` is sorted so terms and prefixes are
+    found with a binary search, ``offsets[i]:offsets[i + 1]`` slices the
+    ``doc_ids``/``weights`` arrays for term ``i``, and doc ids inside a
+    posting list are ascending. ``weights`` holds the BM25F saturated term
+    frequency; the idf part is derived from the posting length at query time.
+    """
+
+    def __init__(
+        self,
+        vocab: Sequence[str],
+        offsets: array,
+        doc_ids: array,
+        weights: array,
+        doc_count: int,
+        avg_lengths: Dict[str, float],
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.doc_count = doc_count
+        self.avg_lengths = avg_lengths
+
+    @classmethod
+    def build(cls, records: Iterable) -> "SearchIndex":
+        """Tokenize every record and build the postings in a single pass"""
+        field_tokens = [_field_tokens(record) for record in records]
+        doc_count = len(field_tokens)
+        avg_lengths = {
+            field: (sum(len(tokens[i]) for tokens in field_tokens) / doc_count if doc_count else 0.0) or 1.0
+            for i, field in enumerate(SEARCH_FIELDS)
+        }
+        return cls(*_postings(field_tokens, avg_lengths), doc_count, avg_lengths)
+
+    def apply(self, store, splice: Splice) -> "SearchIndex":
+        """Index the docs inserted by ``splice`` and drop the removed ones
+
+        The new docs are normalized with the field-length averages of the
+        last full build, so their weights match the existing postings.
+        """
+        field_tokens = [_field_tokens(store[doc_id]) for doc_id in splice.added.tolist()]
+        vocab, offsets, doc_ids, weights = _postings(field_tokens, self.avg_lengths)
+        terms, slots, missing = merge_vocab(self.vocab, vocab)
+        offsets, doc_ids, weights = splice_postings(
+            splice, terms, slots, self.offsets, self.doc_ids, offsets, doc_ids, self.weights, weights
+        )
+        return SearchIndex(
+            splice_strings(self.vocab, terms, missing),
+            to_array("I", offsets),
+            to_array("I", doc_ids),
+            to_array("f", weights),
+            splice.count,
+            self.avg_lengths,
+        )
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def _idf(self, slot: int) -> float:
+        df = self.offsets[slot + 1] - self.offsets[slot]
+        return math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def _find(self, term: str) -> int:
+        """Return the vocabulary slot of ``term`` or -1"""
+        slot = bisect_left(self.vocab, term)
+        if slot < len(self.vocab) and self.vocab[slot] == term:
+            return slot
+        return -1
+
+    def _prefix_slots(self, prefix: str) -> range:
+        start = bisect_left(self.vocab, prefix)
+        end = bisect_left(self.vocab, prefix + "\U0010ffff", lo=start)
+        return range(start, min(end, start + PREFIX_EXPANSION_LIMIT))
+
+    def _group_scores(self, slots: Iterable[int], exact_slot: int) -> Dict[int, float]:
+        """Union the postings of several terms, keeping the best score per doc"""
+        scores: Dict[int, float] = {}
+        for slot in slots:
+            idf = self._idf(slot)
+            if slot != exact_slot:
+                idf *= PREFIX_PENALTY
+            start, end = self.offsets[slot], self.offsets[slot + 1]
+            for doc_id, weight in zip(self.doc_ids[start:end], self.weights[start:end]):
+                score = idf * weight
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+        return scores
+
+    def _probe(self, slot: int, doc_id: int) -> float:
+        """Binary-search a single doc inside a posting list, 0.0 if absent"""
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        pos = bisect_left(self.doc_ids, doc_id, start, end)
+        if pos < end and self.doc_ids[pos] == doc_id:
+            return self.weights[pos]
+        return 0.0
+
+    def match(self, query: str) -> Dict[int, float]:
+        """Return ``{doc_id: score}`` for documents containing every query term
+
+        Work is proportional to the shortest posting list involved: that list
+        seeds the candidates and every other exact term is probed with a
+        binary search into its own postings.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return {}
+
+        *exact_tokens, last = tokens
+        exact_slots = []
+        for token in exact_tokens:
+            slot = self._find(token)
+            if slot < 0:
+                return {}
+            exact_slots.append(slot)
+
+        last_exact = self._find(last)
+        prefix_slots = self._prefix_slots(last)
+        if not prefix_slots:
+            return {}
+
+        exact_slots.sort(key=lambda s: self.offsets[s + 1] - self.offsets[s])
+        prefix_size = sum(self.offsets[s + 1] - self.offsets[s] for s in prefix_slots)
+        if exact_slots and self.offsets[exact_slots[0] + 1] - self.offsets[exact_slots[0]] < prefix_size:
+            seed = exact_slots.pop(0)
+            candidates = self._group_scores((seed,), seed)
+            prefix_scores = self._group_scores(prefix_slots, last_exact)
+            candidates = {
+                doc_id: score + prefix_scores[doc_id]
+                for doc_id, score in candidates.items()
+                if doc_id in prefix_scores
+            }
+        else:
+            candidates = self._group_scores(prefix_slots, last_exact)
+
+        for slot in exact_slots:
+            if not candidates:
+                break
+            idf = self._idf(slot)
+            narrowed = {}
+            for doc_id, score in candidates.items():
+                weight = self._probe(slot, doc_id)
+                if weight:
+                    narrowed[doc_id] = score + idf * weight
+            candidates = narrowed
+        return candidates
+
+    def search(self, query: str) -> List[Tuple[int, float]]:
+        """Return ``(doc_id, score)`` pairs ranked by descending relevance"""
+        return sorted(self.match(query).items(), key=lambda item: (-item[1], item[0]))
@@ -1,28 +1,70 @@
-from fastapi import FastAPI, APIRouter, Query
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 import json
 import csv
+import hashlib
+import random
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional
 import uuid
+import datetime as dt
 from datetime import datetime
 
+from corpus import CorpusSnapshot
+from snapshot_format import read_snapshot, source_digest
+from manifest import delta_path, read_delta
+from facets import intersect
+from store import IDIOM_FIELDS, normalize_idiom
+from related import MAX_DEPTH as MAX_RELATED_DEPTH
+from similar import MAX_K as MAX_SIMILAR
+from sampling import parse_weights
+from write_buffer import BufferFull, WriteBehindBuffer
+from mongo_idioms import MongoIdiomSource
+from export import EXPORT_FORMATS, csv_chunks, ndjson_chunks
+from status_checks import (
+    EXPORT_BATCH_SIZE as STATUS_EXPORT_BATCH_SIZE, PROJECTION as STATUS_PROJECTION, SORT as STATUS_SORT,
+    ensure_status_indexes, export_ndjson, next_cursor as next_status_cursor, status_filter, to_status,
+)
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, COUNT_BUCKETS, HttpMetrics, MetricsMiddleware, MongoCommandMetrics, Registry,
+)
+from shared_corpus import SharedSnapshot
+from responses import FastJSONResponse, dumps, encode_record, encode_records, json_response
+from profiling import PROFILE_ID_HEADER, Profiler, ProfilingMiddleware
+from pagination import (
+    DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER, SEARCH_MODE_HEADER, paginate_ordered, paginate_ranked, parse_fields, projector,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Served at /metrics; recorded by the middleware, the MongoDB command listener and the search endpoints
+metrics_registry = Registry()
+http_metrics = HttpMetrics(metrics_registry, 'idiomflow')
+mongo_metrics = MongoCommandMetrics(metrics_registry, 'idiomflow')
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '5')),
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_MS', '60000')),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    retryWrites=True,
+    event_listeners=[mongo_metrics],
+)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -39,6 +81,20 @@ class Idiom(BaseModel):
     category: str
     origin: str
 
+class IdiomBatchRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=500)
+
+class IdiomSearchSpec(BaseModel):
+    q: Optional[str] = None
+    category: Optional[str] = None
+    difficulty: Optional[str] = None
+    limit: int = Field(50, ge=1, le=1000)
+    fields: Optional[str] = None
+    fuzzy: bool = False
+
+class IdiomSearchBatchRequest(BaseModel):
+    searches: List[IdiomSearchSpec] = Field(..., min_length=1, max_length=100)
+
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
@@ -47,114 +103,649 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+# Responses built from the corpus and MongoDB are encoded without validation;
+# set VALIDATE_RESPONSES=1 to check them against their models again
+VALIDATE_RESPONSES = os.environ.get('VALIDATE_RESPONSES', '0') == '1'
+
+def response_check(model):
+    return TypeAdapter(model) if VALIDATE_RESPONSES else None
+
+IDIOM_CHECK = response_check(Idiom)
+IDIOM_LIST_CHECK = response_check(List[Idiom])
+STATUS_CHECK = response_check(StatusCheck)
+STATUS_LIST_CHECK = response_check(List[StatusCheck])
+
 # Load idioms data from JSON file
-IDIOMS_DATA = []
+IDIOMS_FILE = Path(os.environ.get('IDIOMS_FILE', ROOT_DIR / 'idioms.json'))
+SNAPSHOT_FILE = Path(os.environ.get('IDIOMS_SNAPSHOT', ROOT_DIR / 'idioms.snapshot'))
+# Written by populate_idioms.py next to idioms.json; applied by the file watcher
+DELTA_FILE = delta_path(IDIOMS_FILE)
+IDIOMS_WATCH_INTERVAL = float(os.environ.get('IDIOMS_WATCH_INTERVAL', '0'))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+# Share of requests profiled without asking; admins can profile any request with X-Profile: 1
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+profiler = Profiler(
+    interval=float(os.environ.get('PROFILE_INTERVAL', '0.005')),
+    history=int(os.environ.get('PROFILE_HISTORY', '500')),
+)
+# 'file' serves idioms.json (or its snapshot); 'mongo' serves the idioms collection
+IDIOMS_BACKEND = os.environ.get('IDIOMS_BACKEND', 'file')
+IDIOMS_VERSION_POLL_INTERVAL = float(os.environ.get('IDIOMS_VERSION_POLL_INTERVAL', '5'))
+# With several workers, build each corpus version once and map it from the snapshot file in all of them
+IDIOMS_SHARED = os.environ.get('IDIOMS_SHARED', '0') == '1'
+shared_snapshot = SharedSnapshot(SNAPSHOT_FILE) if IDIOMS_SHARED else None
+idiom_source = MongoIdiomSource(db) if IDIOMS_BACKEND == 'mongo' else None
+
+# The current corpus snapshot. It is only ever replaced as a whole, so
+# handlers must read it once per request and use that local reference.
+CORPUS = CorpusSnapshot.from_entries([])
+RELOAD_LOCK = asyncio.Lock()
+# Version of the idioms collection, or digest of idioms.json, the current corpus was built from
+SOURCE_VERSION = None
+RANDOM = random.Random()
+
+# Status checks are batched into insert_many calls instead of one insert per request
+status_buffer = WriteBehindBuffer(
+    db.status_checks,
+    max_batch=int(os.environ.get('STATUS_BATCH_SIZE', '500')),
+    max_delay=float(os.environ.get('STATUS_FLUSH_INTERVAL', '0.05')),
+    max_pending=int(os.environ.get('STATUS_BUFFER_SIZE', '10000')),
+)
+
+metrics_registry.gauge('idiomflow_corpus_idioms', 'Idioms in the served corpus', collect=lambda: {(): len(CORPUS)})
+metrics_registry.gauge(
+    'idiomflow_status_buffer_depth', 'Status checks waiting to be written', collect=lambda: {(): status_buffer.depth}
+)
+metrics_registry.counter(
+    'idiomflow_status_buffer_documents_total', 'Buffered status checks by outcome', ('outcome',),
+    collect=lambda: {
+        ('flushed',): status_buffer.flushed_documents,
+        ('failed',): status_buffer.failed_documents,
+        ('rejected',): status_buffer.rejected_documents,
+    },
+)
+search_candidates = metrics_registry.histogram(
+    'idiomflow_search_candidates', 'Idioms matching a search before pagination', ('mode',), COUNT_BUCKETS
+)
+search_returned = metrics_registry.counter('idiomflow_search_returned_total', 'Idioms returned by searches', ('mode',))
+
+def read_idioms_file():
+    """Read idioms from the JSON file, or the sample data when it is missing"""
+    if IDIOMS_FILE.exists():
+        with open(IDIOMS_FILE, 'r', encoding='utf-8') as f:
+            idioms_data = json.load(f)
+    else:
+        print("Idioms JSON file not found, using sample data")
+        # Fallback sample data
+        idioms_data = [
+            {
+                "idiom": "Break the ice",
+                "meaning": "To initiate conversation in a social setting",
+                "example": "She told a joke to break the ice at the meeting.",
+                "related_idiom": "Start the ball rolling",
+                "difficulty_level": "Easy",
+                "category": "Popular",
+                "origin": "From old sailing ships breaking ice to create a path"
+            }
+        ]
+    return idioms_data
+
+def build_corpus(current=None, current_source=None):
+    """Build the corpus for idioms.json and return it with the digest of the file
+
+    When ``current`` was built from the file the delta next to idioms.json
+    starts from, the delta is applied to it instead. Otherwise the
+    precompiled snapshot is mapped when it matches idioms.json, else the
+    JSON is parsed. With IDIOMS_SHARED only the first worker to see a new
+    idioms.json does this, parsing in a loader process, and every worker
+    maps the snapshot it publishes.
+    """
+    source = source_digest(IDIOMS_FILE) if IDIOMS_FILE.exists() else None
+    if shared_snapshot is None or source is None:
+        return compile_corpus(current, current_source, source), source
+    if current is not None and current_source == source:
+        # The watcher saw another worker publish the snapshot this one already maps
+        return current, source
+    delta = applicable_delta(current, current_source, source)
+    if delta is None:
+        return shared_snapshot.compile(IDIOMS_FILE, source), source
+    return shared_snapshot.ensure(source, lambda: (apply_idioms_delta(current, delta), source))
+
+def applicable_delta(current, current_source, source):
+    """The delta next to idioms.json if it leads from ``current`` to ``source``"""
+    if current is None or source is None or current_source is None:
+        return None
+    delta = read_delta(DELTA_FILE)
+    if delta and delta["base"] == current_source and delta["version"] == source:
+        return delta
+    return None
+
+def apply_idioms_delta(current, delta):
+    print(f"Applying idioms delta: {len(delta['upserts'])} upserted, {len(delta['removals'])} removed")
+    return current.apply_delta(delta["upserts"], delta["removals"])
+
+def compile_corpus(current, current_source, source):
+    delta = applicable_delta(current, current_source, source)
+    if delta is not None:
+        return apply_idioms_delta(current, delta)
+    if SNAPSHOT_FILE.exists():
+        try:
+            corpus = read_snapshot(SNAPSHOT_FILE, source)
+            if corpus is not None:
+                return corpus
+            print("Idioms snapshot is stale or incompatible, falling back to JSON")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error reading idioms snapshot, falling back to JSON: {e}")
+    return CorpusSnapshot.from_entries(read_idioms_file())
 
 def load_idioms_data():
-    """Load idioms from JSON file"""
-    global IDIOMS_DATA
+    """Load idioms and publish them as the current corpus"""
+    global CORPUS, SOURCE_VERSION
     
     try:
-        idioms_file_path = ROOT_DIR / 'idioms.json'
-        if idioms_file_path.exists():
-            with open(idioms_file_path, 'r', encoding='utf-8') as f:
-                idioms_data = json.load(f)
-                IDIOMS_DATA = [Idiom(id=str(uuid.uuid4()), **idiom) for idiom in idioms_data]
-                print(f"Loaded {len(IDIOMS_DATA)} idioms from JSON file")
-        else:
-            print("Idioms JSON file not found, using sample data")
-            # Fallback sample data
-            sample_idioms = [
-                {
-                    "idiom": "Break the ice",
-                    "meaning": "To initiate conversation in a social setting",
-                    "example": "She told a joke to break the ice at the meeting.",
-                    "related_idiom": "Start the ball rolling",
-                    "difficulty_level": "Easy",
-                    "category": "Popular",
-                    "origin": "From old sailing ships breaking ice to create a path"
-                }
-            ]
-            IDIOMS_DATA = [Idiom(id=str(uuid.uuid4()), **idiom) for idiom in sample_idioms]
+        CORPUS, SOURCE_VERSION = build_corpus()
+        print(f"Loaded {len(CORPUS)} idioms")
     except Exception as e:
         print(f"Error loading idioms: {e}")
-        IDIOMS_DATA = []
+        CORPUS, SOURCE_VERSION = CorpusSnapshot.from_entries([]), None
+    return CORPUS
 
-# Initialize data on startup
+async def compress_payload(snapshot):
+    """Add the compressed /api/idioms variants an incrementally updated snapshot starts without"""
+    if "gzip" not in snapshot.payload.variants:
+        await asyncio.to_thread(snapshot.payload.compress)
+
+async def reload_idioms_data(incremental=False):
+    """Rebuild the corpus in a worker thread and swap it in with one assignment
+
+    With ``incremental`` a delta produced by populate_idioms.py is applied
+    to the current corpus when it starts from the data that corpus was
+    built from. Errors propagate and leave the current snapshot in place.
+    """
+    global CORPUS, SOURCE_VERSION
+    
+    if idiom_source is not None:
+        return await refresh_from_mongo(force=not incremental)
+    async with RELOAD_LOCK:
+        if incremental:
+            snapshot, source = await asyncio.to_thread(build_corpus, CORPUS, SOURCE_VERSION)
+        else:
+            snapshot, source = await asyncio.to_thread(build_corpus)
+        CORPUS, SOURCE_VERSION = snapshot, source
+        await compress_payload(snapshot)
+    logger.info(f"Reloaded {len(snapshot)} idioms, version {snapshot.version}")
+    return snapshot
+
+async def refresh_from_mongo(force=False):
+    """Rebuild the corpus from MongoDB if its version moved past the cached one
+
+    The corpus acts as a read-through cache of the idioms collection: checking
+    it costs one small find_one, and the collection is only read again when
+    another process has published a new version. When that write recorded
+    its changes against the cached version, only the changed idioms are read
+    and applied to the current corpus. ``force`` always reads everything.
+    With IDIOMS_SHARED one worker reads each version and publishes it as the
+    snapshot the others map.
+    """
+    global CORPUS, SOURCE_VERSION
+    
+    async with RELOAD_LOCK:
+        version = await idiom_source.version()
+        if version is None or (version == SOURCE_VERSION and not force):
+            return CORPUS
+        if shared_snapshot is not None:
+            snapshot, version = await shared_snapshot.ensure_async(version, lambda: read_mongo_corpus(force), force)
+        else:
+            snapshot, version = await read_mongo_corpus(force)
+        CORPUS, SOURCE_VERSION = snapshot, version
+        await compress_payload(snapshot)
+    logger.info(f"Loaded {len(snapshot)} idioms from MongoDB, version {version}")
+    return snapshot
+
+async def read_mongo_corpus(force=False):
+    """Build the corpus from MongoDB and return it with its version
+
+    Applies the changes since the current corpus when MongoDB recorded
+    them, unless ``force``.
+    """
+    changes = None
+    if not force and SOURCE_VERSION is not None:
+        changes = await idiom_source.changes_since(SOURCE_VERSION)
+    if changes is not None:
+        version, entries, removed = changes
+        snapshot = await asyncio.to_thread(CORPUS.apply_delta, entries, removed)
+        logger.info(f"Applied {len(entries)} upserted and {len(removed)} removed idioms from MongoDB")
+    else:
+        version, entries = await idiom_source.load()
+        snapshot = await asyncio.to_thread(CorpusSnapshot.from_entries, entries)
+    return snapshot, version
+
+async def watch_idioms_version(interval: float):
+    """Poll the version of the idioms collection, reloading whenever it changes"""
+    while True:
+        try:
+            await refresh_from_mongo()
+        except Exception:
+            logger.exception("Refreshing idioms from MongoDB failed, keeping the current corpus")
+        await asyncio.sleep(interval)
+
+def idioms_file_signature():
+    signature = []
+    for path in (IDIOMS_FILE, SNAPSHOT_FILE):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+async def watch_idioms_file(interval: float):
+    """Poll idioms.json and the snapshot, reloading whenever either changes"""
+    seen = idioms_file_signature()
+    while True:
+        await asyncio.sleep(interval)
+        current = idioms_file_signature()
+        if current == seen:
+            continue
+        try:
+            await reload_idioms_data(incremental=True)
+        except Exception:
+            # Most likely a half-written file; retry on the next tick
+            logger.exception("Reloading idioms failed, keeping the current corpus")
+            continue
+        seen = current
+
+def run_search(corpus, q, category, difficulty, fuzzy, memo=None):
+    """Evaluate one search against ``corpus``
+
+    Returns ``(ranked, doc_ids, fuzzy_used)``: ``ranked`` holds scored
+    ``(doc_id, score)`` pairs for keyword searches and is ``None`` for
+    filter-only ones, which return ascending ``doc_ids`` instead. ``memo``
+    caches rankings and filter results between searches on the same corpus.
+    """
+    memo = {} if memo is None else memo
+    facet_filters = []
+    if category:
+        facet_filters.append((corpus.category_facet, category))
+    if difficulty:
+        facet_filters.append((corpus.difficulty_facet, difficulty))
+    
+    filter_key = ("filter", category or None, difficulty or None)
+    if facet_filters and filter_key not in memo:
+        memo[filter_key] = intersect(facet_filters)
+    if not q:
+        return None, memo[filter_key] if facet_filters else range(len(corpus)), False
+
+    allowed = None
+    if facet_filters:
+        allowed_key = ("allowed",) + filter_key[1:]
+        if allowed_key not in memo:
+            memo[allowed_key] = set(memo[filter_key])
+        allowed = memo[allowed_key]
+
+    def ranking(index, mode):
+        key = (mode, normalize_idiom(q))
+        if key not in memo:
+            memo[key] = index.search(q)
+        ranked = memo[key]
+        if allowed is not None:
+            ranked = [(doc_id, score) for doc_id, score in ranked if doc_id in allowed]
+        return ranked
+
+    ranked = [] if fuzzy else ranking(corpus.search_index, "exact")
+    if ranked:
+        return ranked, None, False
+    return ranking(corpus.fuzzy_index, "fuzzy"), None, True
+
+def record_search(ranked, doc_ids, fuzzy_used, returned):
+    """Count the candidates of one ``run_search`` result and how many of them were returned"""
+    if ranked is None:
+        mode, candidates = "filter", len(doc_ids)
+    else:
+        mode, candidates = "fuzzy" if fuzzy_used else "exact", len(ranked)
+    search_candidates.observe(candidates, (mode,))
+    search_returned.inc((mode,), returned)
+
+# Initialize data on startup; with the MongoDB backend this serves until the first refresh
 load_idioms_data()
 
 # IdiomFlow API Endpoints
-@api_router.get("/idioms", response_model=List[Idiom])
-async def get_all_idioms():
-    """Get all idioms"""
-    return IDIOMS_DATA
+@api_router.get("/idioms", responses={200: {"model": List[Idiom]}})
+async def get_all_idioms(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size, enables pagination"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'summary'")
+):
+    """Get all idioms, optionally paginated and projected
+
+    Without parameters the pre-encoded payload is served, honouring If-None-Match.
+    """
+    corpus = CORPUS
+    if cursor is None and limit is None and fields is None:
+        return corpus.payload.respond(request)
+    
+    names = parse_fields(fields)
+    doc_ids = range(len(corpus))
+    if cursor is not None or limit is not None:
+        doc_ids = paginate_ordered(doc_ids, corpus.sort_keys, cursor, limit or DEFAULT_PAGE_SIZE, response)
+    body = encode_records(corpus.idioms, corpus.payload, doc_ids, names)
+    return json_response(body, response, IDIOM_LIST_CHECK if names is None else None)
 
-@api_router.get("/idioms/search")
+@api_router.get("/idioms/search", responses={200: {"model": List[Idiom]}})
 async def search_idioms(
-    q: Optional[str] = Query(None, description="Search query for idiom or meaning"),
+    response: Response,
+    q: Optional[str] = Query(None, description="Search query for idiom, meaning, example or origin"),
     category: Optional[str] = Query(None, description="Filter by category"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty level"),
-    limit: Optional[int] = Query(50, description="Maximum number of results")
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'summary'"),
+    fuzzy: bool = Query(False, description="Match idioms by trigram similarity to tolerate typos")
 ):
-    """Search and filter idioms"""
-    results = IDIOMS_DATA.copy()
-    
-    if q:
-        q_lower = q.lower()
-        results = [
-            idiom for idiom in results 
-            if q_lower in idiom.idiom.lower() or q_lower in idiom.meaning.lower()
-        ]
-    
-    if category:
-        results = [idiom for idiom in results if idiom.category.lower() == category.lower()]
-    
-    if difficulty:
-        results = [idiom for idiom in results if idiom.difficulty_level.lower() == difficulty.lower()]
+    """Search and filter idioms, ranked by relevance when a query is given
+
+    When an exact search finds nothing, or ``fuzzy=true``, idioms are matched
+    by trigram similarity instead and the X-Search-Mode header says "fuzzy".
+    """
+    corpus = CORPUS
+    names = parse_fields(fields)
+    ranked, doc_ids, fuzzy_used = run_search(corpus, q, category, difficulty, fuzzy)
+    if fuzzy_used:
+        response.headers[SEARCH_MODE_HEADER] = "fuzzy"
+    if ranked is not None:
+        page = paginate_ranked(ranked, corpus.sort_keys, cursor, limit, response)
+    else:
+        page = paginate_ordered(doc_ids, corpus.sort_keys, cursor, limit, response)
+    record_search(ranked, doc_ids, fuzzy_used, len(page))
     
-    return results[:limit]
+    body = encode_records(corpus.idioms, corpus.payload, page, names)
+    return json_response(body, response, IDIOM_LIST_CHECK if names is None else None)
+
+@api_router.post("/idioms/search/batch")
+async def search_idioms_batch(request: IdiomSearchBatchRequest):
+    """Run several searches in one request, returning one result array per search
+
+    Searches share their query rankings, filter intersections and field
+    projections, so repeated keywords or filter combinations are computed once.
+    """
+    corpus = CORPUS
+    memo = {}
+    field_names = {}
+    results = []
+    for spec in request.searches:
+        if spec.fields not in field_names:
+            field_names[spec.fields] = parse_fields(spec.fields)
+        ranked, doc_ids, fuzzy_used = run_search(corpus, spec.q, spec.category, spec.difficulty, spec.fuzzy, memo)
+        if ranked is not None:
+            page = [doc_id for doc_id, _ in ranked[:spec.limit]]
+        else:
+            page = doc_ids[:spec.limit]
+        record_search(ranked, doc_ids, fuzzy_used, len(page))
+        results.append(encode_records(corpus.idioms, corpus.payload, page, field_names[spec.fields]))
+    return json_response(b"[" + b",".join(results) + b"]")
+
+@api_router.get("/idioms/suggest")
+async def suggest_idioms(
+    response: Response,
+    prefix: str = Query(..., min_length=1, max_length=100, description="Text typed so far"),
+    limit: int = Query(8, ge=1, le=25, description="Maximum number of suggestions")
+):
+    """Autocomplete idioms whose text, or one of its words, starts with the prefix"""
+    corpus = CORPUS
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return [
+        {"id": corpus.idioms.id_at(doc_id), "idiom": corpus.idioms.value(doc_id, "idiom")}
+        for doc_id in corpus.suggest_index.suggest(prefix, limit)
+    ]
+
+def sample_idiom(corpus, rng, category, difficulty, weights, fields):
+    parsed_weights = parse_weights(weights, corpus.category_facet.values + corpus.difficulty_facet.values)
+    names = parse_fields(fields)
+    doc_id = corpus.sampler.sample(rng, category, difficulty, parsed_weights)
+    if doc_id is None:
+        raise HTTPException(status_code=404, detail="No idioms match the filters")
+    return encode_record(corpus.idioms, corpus.payload, doc_id, names)
+
+@api_router.get("/idioms/random")
+async def get_random_idiom(
+    response: Response,
+    category: Optional[str] = Query(None, description="Filter by category"),
+    difficulty: Optional[str] = Query(None, description="Filter by difficulty level"),
+    weights: Optional[str] = Query(None, description="Relative weights per category or difficulty, e.g. 'Easy:3,Hard:1'"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'summary'")
+):
+    """Get a random idiom, optionally filtered and weighted"""
+    response.headers["Cache-Control"] = "no-store"
+    return json_response(sample_idiom(CORPUS, RANDOM, category, difficulty, weights, fields), response)
+
+@api_router.get("/idioms/daily")
+async def get_idiom_of_the_day(
+    response: Response,
+    date: Optional[dt.date] = Query(None, description="Day to pick for (UTC, YYYY-MM-DD), defaults to today"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    difficulty: Optional[str] = Query(None, description="Filter by difficulty level"),
+    weights: Optional[str] = Query(None, description="Relative weights per category or difficulty, e.g. 'Easy:3,Hard:1'"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'summary'")
+):
+    """Get the idiom of the day, the same for every caller with the same date and filters
+
+    Cacheable for a full day when the date is given, and until midnight UTC otherwise.
+    """
+    now = datetime.utcnow()
+    max_age = 24 * 60 * 60
+    if date is None:
+        date = now.date()
+        max_age -= now.hour * 3600 + now.minute * 60 + now.second
+    seed = "|".join([date.isoformat(), (category or "").casefold(), (difficulty or "").casefold(), weights or ""])
+    rng = random.Random(int.from_bytes(hashlib.blake2b(seed.encode("utf-8"), digest_size=8).digest(), "big"))
+    body = sample_idiom(CORPUS, rng, category, difficulty, weights, fields)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return json_response(body, response)
+
+@api_router.get("/idioms/export")
+async def export_idioms(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="'ndjson' or 'csv'"),
+    q: Optional[str] = Query(None, description="Only idioms matching this search, most relevant first"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    difficulty: Optional[str] = Query(None, description="Filter by difficulty level"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export, or 'summary'")
+):
+    """Stream the corpus, or the matching part of it, as NDJSON or CSV"""
+    corpus = CORPUS
+    names = parse_fields(fields) or IDIOM_FIELDS
+    ranked, doc_ids, _ = run_search(corpus, q, category, difficulty, False)
+    if ranked is not None:
+        doc_ids = (doc_id for doc_id, _ in ranked)
+    encode = csv_chunks if format == "csv" else ndjson_chunks
+    return StreamingResponse(
+        encode(corpus.idioms, doc_ids, names),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="idioms.{format}"'},
+    )
+
+@api_router.post("/idioms/batch")
+async def get_idioms_batch(request: IdiomBatchRequest):
+    """Get several idioms by id in one request, in the order requested"""
+    corpus = CORPUS
+    found = []
+    missing = []
+    for idiom_id in dict.fromkeys(request.ids):
+        position = corpus.idioms.find(idiom_id)
+        if position is None:
+            missing.append(idiom_id)
+        else:
+            found.append(position)
+    idioms = encode_records(corpus.idioms, corpus.payload, found)
+    return json_response(b'{"idioms":' + idioms + b',"missing":' + dumps(missing) + b"}")
+
+@api_router.get("/idioms/{idiom_id}", responses={200: {"model": Idiom}})
+async def get_idiom(idiom_id: str):
+    """Get a single idiom by its stable id"""
+    corpus = CORPUS
+    position = corpus.idioms.find(idiom_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Idiom not found")
+    return json_response(encode_record(corpus.idioms, corpus.payload, position), check=IDIOM_CHECK)
+
+@api_router.get("/idioms/{idiom_id}/related")
+async def get_related_idioms(
+    idiom_id: str,
+    depth: int = Query(1, ge=1, le=MAX_RELATED_DEPTH, description="Maximum number of hops"),
+    limit: int = Query(25, ge=1, le=200, description="Maximum number of idioms"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'summary'")
+):
+    """Get idioms linked through related_idiom, nearest first, each with its hop count"""
+    corpus = CORPUS
+    project = projector(parse_fields(fields))
+    position = corpus.idioms.find(idiom_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Idiom not found")
+    related = []
+    for doc_id, hops in corpus.related_graph.traverse(position, depth, limit):
+        idiom = project(corpus.idioms[doc_id])
+        idiom["depth"] = hops
+        related.append(idiom)
+    return json_response(dumps(related))
+
+@api_router.get("/idioms/{idiom_id}/similar")
+async def get_similar_idioms(
+    idiom_id: str,
+    k: int = Query(10, ge=1, le=MAX_SIMILAR, description="Number of similar idioms"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'summary'")
+):
+    """Get the idioms whose meaning and example are closest by TF-IDF cosine similarity"""
+    corpus = CORPUS
+    project = projector(parse_fields(fields))
+    position = corpus.idioms.find(idiom_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Idiom not found")
+    similar = []
+    for doc_id, score in corpus.similarity_index.similar(position, k):
+        idiom = project(corpus.idioms[doc_id])
+        idiom["score"] = round(score, 4)
+        similar.append(idiom)
+    return json_response(dumps(similar))
 
 @api_router.get("/categories")
 async def get_categories():
-    """Get all available categories"""
-    categories = list(set([idiom.category for idiom in IDIOMS_DATA]))
-    return {"categories": categories}
+    """Get all available categories with the number of idioms in each"""
+    facet = CORPUS.category_facet
+    return {"categories": facet.values, "counts": facet.counts}
 
 @api_router.get("/difficulties")
 async def get_difficulty_levels():
-    """Get all difficulty levels"""
-    difficulties = list(set([idiom.difficulty_level for idiom in IDIOMS_DATA]))
-    return {"difficulties": difficulties}
+    """Get all difficulty levels with the number of idioms in each"""
+    facet = CORPUS.difficulty_facet
+    return {"difficulties": facet.values, "counts": facet.counts}
 
 @api_router.get("/stats")
 async def get_stats():
     """Get statistics about the idioms database"""
-    total_idioms = len(IDIOMS_DATA)
-    categories = len(set([idiom.category for idiom in IDIOMS_DATA]))
-    difficulties = len(set([idiom.difficulty_level for idiom in IDIOMS_DATA]))
-    
+    corpus = CORPUS
     return {
-        "total_idioms": total_idioms,
-        "categories": categories,
-        "difficulty_levels": difficulties
+        "total_idioms": len(corpus),
+        "categories": len(corpus.category_facet.values),
+        "difficulty_levels": len(corpus.difficulty_facet.values),
+        "category_counts": corpus.category_facet.counts,
+        "difficulty_counts": corpus.difficulty_facet.counts,
+        "version": corpus.version
     }
 
+def require_admin(token):
+    if not ADMIN_TOKEN or token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@api_router.post("/admin/reload")
+async def reload_idioms(x_admin_token: Optional[str] = Header(None)):
+    """Reload the idioms from MongoDB, the snapshot or JSON without restarting the worker"""
+    require_admin(x_admin_token)
+    try:
+        snapshot = await reload_idioms_data()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    return {"total_idioms": len(snapshot), "version": snapshot.version}
+
+@api_router.get("/admin/profiles")
+async def list_profiles(
+    x_admin_token: Optional[str] = Header(None),
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of profiles")
+):
+    """Summaries of the most recently profiled requests, newest first"""
+    require_admin(x_admin_token)
+    return [profile.summary() for profile in profiler.recent(limit)]
+
+@api_router.get("/admin/profiles/hot")
+async def get_hot_functions(
+    x_admin_token: Optional[str] = Header(None),
+    window: float = Query(300, gt=0, description="Seconds of profiles to aggregate"),
+    limit: int = Query(25, ge=1, le=500, description="Maximum number of functions")
+):
+    """Functions with the most samples across recent profiles"""
+    require_admin(x_admin_token)
+    return profiler.hot_functions(window, limit)
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """One request's profile as collapsed stacks, for flamegraph.pl or speedscope"""
+    require_admin(x_admin_token)
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(profile.collapsed(), media_type="text/plain")
+
 # Original endpoints
 @api_router.get("/")
 async def root():
     return {"message": "Welcome to IdiomFlow API - Educational Idioms Platform by Sisher Pant & LinkFlow IT Tech"}
 
-@api_router.post("/status", response_model=StatusCheck)
+@api_router.post("/status", responses={200: {"model": StatusCheck}})
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
+    """Record a status check; it is written to MongoDB by the write-behind buffer"""
+    status = StatusCheck(client_name=input.client_name).model_dump()
+    try:
+        # A copy, since insert_many adds the _id to the documents it writes
+        await status_buffer.put(dict(status))
+    except BufferFull:
+        raise HTTPException(status_code=503, detail="Too many pending status checks", headers={"Retry-After": "1"})
+    return json_response(dumps(status), check=STATUS_CHECK)
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+@api_router.get("/status/metrics")
+async def get_status_write_metrics():
+    """Queue depth and flush latency of the status check write buffer"""
+    return status_buffer.metrics()
+
+@api_router.get("/status", responses={200: {"model": List[StatusCheck]}})
+async def get_status_checks(
+    response: Response,
+    client_name: Optional[str] = Query(None, description="Only checks from this client"),
+    since: Optional[datetime] = Query(None, description="Only checks at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only checks before this time"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    limit: int = Query(100, ge=1, le=1000, description="Page size"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="'ndjson' streams every matching check")
+):
+    """Get status checks, newest first, one keyset page at a time or streamed as NDJSON"""
+    query = status_filter(client_name, since, until, cursor)
+    documents = db.status_checks.find(query, STATUS_PROJECTION).sort(STATUS_SORT)
+    if format == "ndjson":
+        return StreamingResponse(
+            export_ndjson(documents.batch_size(STATUS_EXPORT_BATCH_SIZE)), media_type="application/x-ndjson"
+        )
+    
+    # One extra document tells whether another page exists
+    page = await documents.limit(limit + 1).to_list(limit + 1)
+    if len(page) > limit:
+        page = page[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = next_status_cursor(page[-1])
+    return json_response(dumps([to_status(document) for document in page]), response, STATUS_LIST_CHECK)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Every metric in the Prometheus text format"""
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -165,7 +756,11 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, SEARCH_MODE_HEADER, PROFILE_ID_HEADER],
 )
+app.add_middleware(ProfilingMiddleware, profiler=profiler, admin_token=ADMIN_TOKEN, sample_rate=PROFILE_SAMPLE_RATE)
+# Outermost, so the time spent in the other middleware is measured too
+app.add_middleware(MetricsMiddleware, metrics=http_metrics)
 
 # Configure logging
 logging.basicConfig(
@@ -174,6 +769,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+watch_task = None
+index_task = None
+
+async def create_indexes():
+    try:
+        await ensure_status_indexes(db.status_checks)
+        if idiom_source is not None:
+            await idiom_source.ensure_indexes()
+    except Exception:
+        logger.exception("Creating MongoDB indexes failed")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global watch_task, index_task
+    status_buffer.start()
+    # In the background so an unreachable MongoDB does not hold up startup
+    index_task = asyncio.create_task(create_indexes())
+    if idiom_source is not None:
+        watch_task = asyncio.create_task(watch_idioms_version(IDIOMS_VERSION_POLL_INTERVAL))
+    elif IDIOMS_WATCH_INTERVAL > 0:
+        watch_task = asyncio.create_task(watch_idioms_file(IDIOMS_WATCH_INTERVAL))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in (watch_task, index_task):
+        if task is not None:
+            task.cancel()
+    await status_buffer.close()
     client.close()
@@ -0,0 +1,135 @@
+"""
+One corpus snapshot built once per host and mapped read-only by every worker
+
+With several uvicorn or gunicorn workers each process would otherwise
+parse idioms.json (or read MongoDB) and build its own indexes. Instead the
+first worker to need a corpus version takes an exclusive lock next to the
+snapshot file, builds the corpus and writes the snapshot; the others wait
+on the lock and then map the file it wrote. Mapped pages live in the page
+cache, shared by all workers, so a worker's private memory holds almost
+none of the corpus. The same applies under ``gunicorn --preload``, where
+the master maps the snapshot before forking.
+
+Snapshots are replaced with a rename, so workers still mapping the
+previous version keep a valid file until they swap to the new one.
+"""
+
+import asyncio
+import fcntl
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, Tuple
+
+from corpus import CorpusSnapshot
+from payload import BROTLI_QUALITY
+from snapshot_format import read_snapshot, write_snapshot
+
+BUILD_SCRIPT = Path(__file__).parent / "build_snapshot.py"
+
+
+class SharedSnapshot:
+    """The snapshot file workers publish and map, and the lock serializing its builds
+
+    ``version`` is whatever identifies the data a corpus was built from,
+    the digest of idioms.json or the version of the MongoDB collection; it
+    is stored as the snapshot's source digest.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = Path(f"{path}.lock")
+
+    def read(self, version: str) -> Optional[CorpusSnapshot]:
+        """Map the snapshot if it holds ``version``, else ``None``"""
+        try:
+            return read_snapshot(self.path, version)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def publish(self, corpus: CorpusSnapshot, version: str) -> CorpusSnapshot:
+        """Write ``corpus`` as the snapshot of ``version`` and return it mapped"""
+        if "gzip" not in corpus.payload.variants:
+            corpus.payload.compress()
+        write_snapshot(corpus, self.path, version)
+        mapped = read_snapshot(self.path, version)
+        if mapped is None:
+            raise RuntimeError(f"{self.path} was replaced while it was being published")
+        return mapped
+
+    def _lock(self) -> int:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def ensure(
+        self, version: str, build: Callable[[], Tuple[CorpusSnapshot, str]]
+    ) -> Tuple[CorpusSnapshot, str]:
+        """Map the snapshot of ``version``, publishing ``build()`` first if no worker has yet
+
+        ``build`` returns a corpus with the version it was built from, which
+        may be newer than ``version``; it is published under its own.
+        """
+        corpus = self.read(version)
+        if corpus is not None:
+            return corpus, version
+        fd = self._lock()
+        try:
+            # Another worker may have published it while this one waited
+            corpus = self.read(version)
+            if corpus is not None:
+                return corpus, version
+            built, built_version = build()
+            return self.publish(built, built_version), built_version
+        finally:
+            self._unlock(fd)
+
+    def compile(self, source: Path, version: str) -> CorpusSnapshot:
+        """Map the snapshot of ``version``, compiling ``source`` in a loader process if no worker has yet
+
+        The loader parses the JSON and builds the indexes, so none of that
+        ends up in the heap of a worker, which would keep it after mapping.
+        """
+        corpus = self.read(version)
+        if corpus is not None:
+            return corpus
+        fd = self._lock()
+        try:
+            corpus = self.read(version)
+            if corpus is None:
+                subprocess.run(
+                    [sys.executable, str(BUILD_SCRIPT), "--source", str(source), "--output", str(self.path),
+                     "--brotli-quality", str(BROTLI_QUALITY)],
+                    check=True,
+                )
+                corpus = self.read(version)
+        finally:
+            self._unlock(fd)
+        if corpus is None:
+            raise RuntimeError(f"{source} changed while it was being compiled")
+        return corpus
+
+    async def ensure_async(
+        self, version: str, build: Callable[[], Awaitable[Tuple[CorpusSnapshot, str]]], rebuild: bool = False
+    ) -> Tuple[CorpusSnapshot, str]:
+        """``ensure`` for builds that read MongoDB; ``rebuild`` publishes a new build regardless"""
+        if not rebuild:
+            corpus = await asyncio.to_thread(self.read, version)
+            if corpus is not None:
+                return corpus, version
+        fd = await asyncio.to_thread(self._lock)
+        try:
+            if not rebuild:
+                corpus = await asyncio.to_thread(self.read, version)
+                if corpus is not None:
+                    return corpus, version
+            built, built_version = await build()
+            return await asyncio.to_thread(self.publish, built, built_version), built_version
+        finally:
+            self._unlock(fd)
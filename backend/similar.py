@@ -0,0 +1,185 @@
+"""
+TF-IDF "more like this" recommendations over meaning and example text
+"""
+
+import math
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+from splice import Splice
+
+SIMILAR_FIELDS = ("meaning", "example")
+# Terms in more than this share of the docs say nothing about similarity
+MAX_DF_RATIO = 0.5
+# Neighbors are computed once at this depth and sliced for smaller ``k``
+MAX_K = 50
+CACHE_SIZE = 10_000
+# Bounds the (batch, doc_count) score matrix of one top_k call
+BATCH_SIZE = 16
+
+
+class SimilarityIndex:
+    """Unit-length TF-IDF vectors stored both by doc (CSR) and by term (CSC)
+
+    ``row_terms[row_offsets[d]:row_offsets[d + 1]]`` are the terms of doc
+    ``d`` with their ``row_counts`` and ``row_weights``, term ids indexing
+    ``terms``; ``col_docs``/``col_weights`` sliced by
+    ``col_offsets`` are the docs of each term. Cosine scores against every
+    doc are one ``bincount`` over the postings of the query doc's terms.
+    Terms found in a single doc, or in too many, are left out of the
+    postings since they cannot rank one neighbor above another.
+    """
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        row_offsets: Sequence[int],
+        row_terms: Sequence[int],
+        row_counts: Sequence[int],
+        row_weights: Sequence[float],
+        col_offsets: Sequence[int],
+        col_docs: Sequence[int],
+        col_weights: Sequence[float],
+    ):
+        self.terms = terms
+        self.row_offsets = np.asarray(row_offsets, dtype=np.uint32)
+        self.row_terms = np.asarray(row_terms, dtype=np.uint32)
+        self.row_counts = np.asarray(row_counts, dtype=np.uint16)
+        self.row_weights = np.asarray(row_weights, dtype=np.float32)
+        self.col_offsets = np.asarray(col_offsets, dtype=np.uint32)
+        self.col_docs = np.asarray(col_docs, dtype=np.uint32)
+        self.col_weights = np.asarray(col_weights, dtype=np.float32)
+        self.doc_count = len(self.row_offsets) - 1
+        self._cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def build(cls, store) -> "SimilarityIndex":
+        term_ids: Dict[str, int] = {}
+        lengths, row_terms, row_counts = _count_terms(store, range(len(store)), term_ids)
+        row_offsets = np.zeros(len(store) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=row_offsets[1:])
+        return cls.from_rows(list(term_ids), row_offsets, row_terms, row_counts)
+
+    @classmethod
+    def from_rows(
+        cls, terms: Sequence[str], row_offsets: np.ndarray, row_terms: np.ndarray, row_counts: np.ndarray
+    ) -> "SimilarityIndex":
+        """Weight the term counts of every doc and index them by term"""
+        doc_count = len(row_offsets) - 1
+        lengths = np.diff(row_offsets.astype(np.int64))
+        df = np.bincount(row_terms, minlength=len(terms))
+        idf = (np.log((1.0 + doc_count) / (1.0 + df)) + 1.0).astype(np.float32)
+        weights = (1.0 + np.log(row_counts.astype(np.float32))) * idf[row_terms]
+        row_of = np.repeat(np.arange(doc_count, dtype=np.uint32), lengths)
+        norms = np.sqrt(np.bincount(row_of, weights=weights * weights, minlength=doc_count))
+        norms[norms == 0] = 1.0
+        weights /= norms[row_of].astype(np.float32)
+
+        useful = (df[row_terms] > 1) & (df[row_terms] <= max(2, math.floor(MAX_DF_RATIO * doc_count)))
+        order = np.argsort(row_terms[useful], kind="stable")
+        col_docs = row_of[useful][order]
+        col_weights = weights[useful][order]
+        col_offsets = np.zeros(len(terms) + 1, dtype=np.uint32)
+        np.cumsum(np.bincount(row_terms[useful], minlength=len(terms)), out=col_offsets[1:])
+        return cls(terms, row_offsets, row_terms, row_counts, weights, col_offsets, col_docs, col_weights)
+
+    def apply(self, store, splice: Splice) -> "SimilarityIndex":
+        """Count the terms of the docs inserted by ``splice`` and drop the removed rows
+
+        Only the new docs are tokenized; every weight is then recomputed
+        from the stored counts, so the result equals a full build.
+        """
+        terms = [self.terms[i] for i in range(len(self.terms))]
+        term_ids = {term: i for i, term in enumerate(terms)}
+        lengths, new_terms, new_counts = _count_terms(store, splice.added.tolist(), term_ids)
+        terms.extend(list(term_ids)[len(terms):])
+
+        starts = self.row_offsets[splice.kept].astype(np.int64)
+        ends = self.row_offsets[splice.kept + 1].astype(np.int64)
+        positions = _ranges(starts, ends)
+        # Rows stay in doc order: insert each new row before the first kept row after it
+        at = np.searchsorted(np.repeat(splice.kept_positions, ends - starts), np.repeat(splice.added, lengths))
+        row_terms = np.insert(self.row_terms[positions], at, new_terms)
+        row_counts = np.insert(self.row_counts[positions], at, new_counts)
+        row_offsets = np.zeros(splice.count + 1, dtype=np.int64)
+        np.cumsum(splice.gather(np.diff(self.row_offsets.astype(np.int64)), lengths, np.int64), out=row_offsets[1:])
+        return SimilarityIndex.from_rows(terms, row_offsets, row_terms, row_counts)
+
+    def _scores(self, doc_ids: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each of ``doc_ids`` against every doc, shape (batch, doc_count)"""
+        starts, ends = self.row_offsets[doc_ids], self.row_offsets[doc_ids + 1]
+        positions = _ranges(starts, ends)
+        query_rows = np.repeat(np.arange(len(doc_ids)), (ends - starts).astype(np.int64))
+        terms = self.row_terms[positions]
+
+        col_starts, col_ends = self.col_offsets[terms], self.col_offsets[terms + 1]
+        lengths = (col_ends - col_starts).astype(np.int64)
+        postings = _ranges(col_starts, col_ends)
+        cells = np.repeat(query_rows, lengths) * self.doc_count + self.col_docs[postings]
+        products = np.repeat(self.row_weights[positions], lengths) * self.col_weights[postings]
+        scores = np.bincount(cells, weights=products, minlength=len(doc_ids) * self.doc_count)
+        return scores.reshape(len(doc_ids), self.doc_count)
+
+    def top_k(self, doc_ids: Sequence[int], k: int = MAX_K) -> List[List[Tuple[int, float]]]:
+        """Return the ``k`` most similar ``(doc_id, score)`` pairs for each doc, best first"""
+        found = {doc_id: self._cache[doc_id] for doc_id in doc_ids if doc_id in self._cache}
+        missing = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id not in found]
+        depth = min(MAX_K, self.doc_count - 1)
+        for start in range(0, len(missing), BATCH_SIZE):
+            batch = np.asarray(missing[start:start + BATCH_SIZE], dtype=np.int64)
+            scores = self._scores(batch)
+            scores[np.arange(len(batch)), batch] = 0.0
+            if depth > 0:
+                top = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+            else:
+                top = np.empty((len(batch), 0), dtype=np.int64)
+            for row, doc_id in enumerate(batch.tolist()):
+                candidates = top[row][scores[row, top[row]] > 0]
+                # Best score first, ties in corpus order so results are stable
+                candidates = candidates[np.lexsort((candidates, -scores[row, candidates]))]
+                found[doc_id] = (candidates, scores[row, candidates])
+                self._remember(doc_id, found[doc_id])
+
+        return [
+            list(zip(found[doc_id][0][:k].tolist(), found[doc_id][1][:k].tolist()))
+            for doc_id in doc_ids
+        ]
+
+    def similar(self, doc_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        return self.top_k([doc_id], k)[0]
+
+    def _remember(self, doc_id: int, neighbors: Tuple[np.ndarray, np.ndarray]) -> None:
+        if len(self._cache) >= CACHE_SIZE:
+            del self._cache[next(iter(self._cache))]
+        self._cache[doc_id] = neighbors
+
+
+def _count_terms(store, doc_ids, term_ids: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Row lengths, term ids and counts of the given docs, adding unseen terms to ``term_ids``"""
+    doc_terms: List[Counter] = []
+    for doc_id in doc_ids:
+        counts = Counter()
+        for field in SIMILAR_FIELDS:
+            for token in tokenize(store.value(doc_id, field)):
+                counts[term_ids.setdefault(token, len(term_ids))] += 1
+        doc_terms.append(counts)
+    lengths = np.fromiter((len(c) for c in doc_terms), dtype=np.int64, count=len(doc_terms))
+    total = int(lengths.sum())
+    row_terms = np.fromiter((term for counts in doc_terms for term in counts), dtype=np.uint32, count=total)
+    row_counts = np.fromiter(
+        (min(count, 0xFFFF) for counts in doc_terms for count in counts.values()), dtype=np.uint16, count=total
+    )
+    return lengths, row_terms, row_counts
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenate ``arange(start, end)`` for every pair without a Python loop"""
+    lengths = (ends - starts).astype(np.int64)
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    shifts = np.repeat(starts.astype(np.int64) - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(total, dtype=np.int64) + shifts
@@ -0,0 +1,258 @@
+"""
+Binary corpus snapshot: a versioned file the server memory-maps at startup
+
+Layout::
+
+    magic (8 bytes) | format version (uint32) | header length (uint32)
+    header (JSON)   | padding to 8 bytes
+    sections...     each 8-byte aligned, native byte order
+
+The header lists every section as ``[offset, length, typecode]`` relative
+to the first section, plus the small metadata that is cheaper to keep as
+JSON (interned category and difficulty values, facet values, BM25F
+field-length averages, payload digest). Sections hold the store columns, the search postings, the trigram
+postings, the autocomplete entries, the related-idiom graph, the TF-IDF
+vectors and term counts, the facet postings and the pre-encoded
+``/api/idioms`` payload variants with their record spans, so loading is a
+handful of ``memoryview`` slices with no parsing or validation. Everything
+an incremental update needs is kept, so a mapped corpus can take a delta.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from corpus import CorpusSnapshot
+from facets import FacetIndex
+from fuzzy import TrigramIndex
+from manifest import source_digest
+from payload import EncodedPayload
+from related import RelatedGraph
+from search_index import SearchIndex
+from similar import SimilarityIndex
+from store import CODED_FIELDS, TEXT_FIELDS, IdiomStore, StringColumn
+from suggest import SuggestIndex
+
+MAGIC = b"IDFSNAP\0"
+FORMAT_VERSION = 6
+ALIGN = 8
+_PREAMBLE = struct.Struct("<8sII")
+FACET_FIELDS = ("category", "difficulty_level")
+
+
+def _as_column(values) -> StringColumn:
+    return values if isinstance(values, StringColumn) else StringColumn.from_strings(values)
+
+
+def _facet_sections(facet: FacetIndex) -> Tuple[array, array]:
+    """Concatenate the per-value postings of a facet into ids and offsets"""
+    ids = array("I")
+    offsets = array("I", [0])
+    for postings in facet.postings:
+        ids.extend(postings)
+        offsets.append(len(ids))
+    return ids, offsets
+
+
+def write_snapshot(corpus: CorpusSnapshot, path: Path, source: Optional[str] = None) -> int:
+    """Serialize ``corpus`` to ``path`` atomically and return its size in bytes"""
+    store: IdiomStore = corpus.idioms
+    index: SearchIndex = corpus.search_index
+    sections: Dict[str, object] = {
+        "ids": store.ids,
+        "ids_sorted": store.ids_sorted,
+        "ids_sorted_positions": store.ids_sorted_positions,
+        "keys.buffer": store.keys.buffer,
+        "keys.offsets": store.keys.offsets,
+    }
+    for field in TEXT_FIELDS:
+        sections[f"text.{field}.buffer"] = store.text_columns[field].buffer
+        sections[f"text.{field}.offsets"] = store.text_columns[field].offsets
+    for field in CODED_FIELDS:
+        sections[f"codes.{field}"] = store.code_columns[field]
+
+    vocab = _as_column(index.vocab)
+    sections.update({
+        "search.vocab.buffer": vocab.buffer,
+        "search.vocab.offsets": vocab.offsets,
+        "search.offsets": index.offsets,
+        "search.doc_ids": index.doc_ids,
+        "search.weights": index.weights,
+    })
+    fuzzy: TrigramIndex = corpus.fuzzy_index
+    grams = _as_column(fuzzy.grams)
+    sections.update({
+        "fuzzy.grams.buffer": grams.buffer,
+        "fuzzy.grams.offsets": grams.offsets,
+        "fuzzy.offsets": fuzzy.offsets,
+        "fuzzy.doc_ids": fuzzy.doc_ids,
+        "fuzzy.gram_counts": fuzzy.gram_counts,
+    })
+    suggest: SuggestIndex = corpus.suggest_index
+    entries = _as_column(suggest.entries)
+    sections.update({
+        "suggest.entries.buffer": entries.buffer,
+        "suggest.entries.offsets": entries.offsets,
+        "suggest.entry_docs": suggest.entry_docs,
+        "suggest.ranks": suggest.ranks,
+        "suggest.tree": suggest.tree,
+    })
+    graph: RelatedGraph = corpus.related_graph
+    sections["graph.targets"] = graph.targets
+    sections["graph.offsets"] = graph.offsets
+    sections["graph.neighbors"] = graph.neighbors
+    similarity: SimilarityIndex = corpus.similarity_index
+    terms = _as_column(similarity.terms)
+    sections["similar.terms.buffer"] = terms.buffer
+    sections["similar.terms.offsets"] = terms.offsets
+    for name in ("row_offsets", "row_terms", "row_counts", "row_weights", "col_offsets", "col_docs", "col_weights"):
+        sections[f"similar.{name}"] = getattr(similarity, name)
+    facets = {"category": corpus.category_facet, "difficulty_level": corpus.difficulty_facet}
+    for field, facet in facets.items():
+        ids, offsets = _facet_sections(facet)
+        sections[f"facet.{field}.ids"] = ids
+        sections[f"facet.{field}.offsets"] = offsets
+    for coding, body in corpus.payload.variants.items():
+        sections[f"payload.{coding or 'identity'}"] = body
+    sections["payload_spans"] = corpus.payload.spans
+
+    layout = {}
+    chunks = []
+    offset = 0
+    for name, data in sections.items():
+        view = memoryview(data)
+        raw = view.cast("B") if view.format != "B" else view
+        layout[name] = [offset, raw.nbytes, view.format]
+        padding = -raw.nbytes % ALIGN
+        chunks.append(bytes(raw) + b"\0" * padding)
+        offset += raw.nbytes + padding
+
+    header = {
+        "byteorder": sys.byteorder,
+        "source_digest": source,
+        "doc_count": len(store),
+        "code_values": store.code_values,
+        "facet_values": {field: facet.values for field, facet in facets.items()},
+        "search_avg_lengths": index.avg_lengths,
+        "payload_digest": corpus.payload.digest,
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(_PREAMBLE.size + len(header_bytes)) % ALIGN)
+
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for chunk in chunks:
+            f.write(chunk)
+        size = f.tell()
+    # Replace rather than rewrite so workers mapping the old file keep a valid inode
+    os.replace(tmp_path, path)
+    return size
+
+
+def read_snapshot(path: Path, source: Optional[str] = None) -> Optional[CorpusSnapshot]:
+    """Map ``path`` and return its corpus, or ``None`` if it is stale or incompatible
+
+    ``source`` is the digest of the idioms.json the snapshot must have been
+    built from; pass ``None`` to accept any snapshot. A truncated file
+    raises ``ValueError`` like any other unreadable one.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if len(view) < _PREAMBLE.size:
+        raise ValueError(f"{path} is truncated")
+    magic, version, header_length = _PREAMBLE.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an idiom snapshot")
+    if version != FORMAT_VERSION:
+        return None
+    data_start = _PREAMBLE.size + header_length
+    if len(view) < data_start:
+        raise ValueError(f"{path} is truncated")
+    header = json.loads(bytes(view[_PREAMBLE.size:data_start]))
+    if header["byteorder"] != sys.byteorder:
+        return None
+    if source is not None and header["source_digest"] != source:
+        return None
+    # Slicing past the end of the map would silently return short sections
+    for name, (offset, length, _) in header["sections"].items():
+        if data_start + offset + length > len(view):
+            raise ValueError(f"{path} is truncated: section {name} ends past the end of the file")
+
+    def section(name):
+        offset, length, typecode = header["sections"][name]
+        raw = view[data_start + offset:data_start + offset + length]
+        return raw if typecode == "B" else raw.cast(typecode)
+
+    store = IdiomStore(
+        ids=section("ids"),
+        keys=StringColumn(section("keys.buffer"), section("keys.offsets")),
+        text_columns={
+            field: StringColumn(section(f"text.{field}.buffer"), section(f"text.{field}.offsets"))
+            for field in TEXT_FIELDS
+        },
+        code_values=header["code_values"],
+        code_columns={field: section(f"codes.{field}") for field in CODED_FIELDS},
+        ids_sorted=section("ids_sorted"),
+        ids_sorted_positions=section("ids_sorted_positions"),
+    )
+    search_index = SearchIndex(
+        StringColumn(section("search.vocab.buffer"), section("search.vocab.offsets")),
+        section("search.offsets"),
+        section("search.doc_ids"),
+        section("search.weights"),
+        header["doc_count"],
+        header["search_avg_lengths"],
+    )
+    fuzzy_index = TrigramIndex(
+        StringColumn(section("fuzzy.grams.buffer"), section("fuzzy.grams.offsets")),
+        section("fuzzy.offsets"),
+        section("fuzzy.doc_ids"),
+        section("fuzzy.gram_counts"),
+    )
+    suggest_index = SuggestIndex(
+        StringColumn(section("suggest.entries.buffer"), section("suggest.entries.offsets")),
+        section("suggest.entry_docs"),
+        section("suggest.ranks"),
+        section("suggest.tree"),
+    )
+    related_graph = RelatedGraph(section("graph.targets"), section("graph.offsets"), section("graph.neighbors"))
+    similarity_index = SimilarityIndex(
+        StringColumn(section("similar.terms.buffer"), section("similar.terms.offsets")),
+        section("similar.row_offsets"),
+        section("similar.row_terms"),
+        section("similar.row_counts"),
+        section("similar.row_weights"),
+        section("similar.col_offsets"),
+        section("similar.col_docs"),
+        section("similar.col_weights"),
+    )
+    facets = {}
+    for field in FACET_FIELDS:
+        ids = section(f"facet.{field}.ids")
+        offsets = section(f"facet.{field}.offsets")
+        postings = [ids[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        facets[field] = FacetIndex(field, header["facet_values"][field], postings)
+    variants = {
+        (None if name == "payload.identity" else name[len("payload."):]): section(name)
+        for name in header["sections"] if name.startswith("payload.")
+    }
+    return CorpusSnapshot(
+        store,
+        search_index=search_index,
+        fuzzy_index=fuzzy_index,
+        suggest_index=suggest_index,
+        related_graph=related_graph,
+        similarity_index=similarity_index,
+        category_facet=facets["category"],
+        difficulty_facet=facets["difficulty_level"],
+        payload=EncodedPayload(variants, header["payload_digest"], spans=section("payload_spans")),
+    )
@@ -0,0 +1,172 @@
+"""
+Merging removals and insertions into sorted columns and postings without rebuilding them
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+_DTYPES = {"H": np.uint16, "I": np.uint32, "Q": np.uint64, "f": np.float32}
+
+
+def to_array(typecode: str, values) -> array:
+    """Copy a NumPy array into an ``array.array`` of ``typecode``"""
+    result = array(typecode)
+    result.frombytes(np.ascontiguousarray(values, dtype=_DTYPES[typecode]).tobytes())
+    return result
+
+
+class KeptView:
+    """Read-only view of ``values`` at the ``kept`` positions, for bisecting the survivors"""
+
+    __slots__ = ("values", "kept")
+
+    def __init__(self, values: Sequence, kept: np.ndarray):
+        self.values = values
+        self.kept = kept
+
+    def __len__(self) -> int:
+        return len(self.kept)
+
+    def __getitem__(self, position: int):
+        return self.values[int(self.kept[position])]
+
+
+class Splice:
+    """Where the items of a sorted sequence land after some are removed and others inserted
+
+    ``keep`` flags the old items that survive and ``insert_at[j]`` is the
+    number of survivors sorting before the ``j``-th inserted item, inserted
+    items being in sorted order themselves. Survivors keep their relative
+    order, so ``old_to_new`` (-1 for removed items) and ``added`` (positions
+    of the inserted items) are both increasing, and ``pieces`` describes the
+    result as a few runs of old items and inserted items that can be copied
+    as slices.
+    """
+
+    def __init__(self, keep: np.ndarray, insert_at: Sequence[int]):
+        insert_at = np.asarray(insert_at, dtype=np.int64)
+        self.kept = np.flatnonzero(keep)
+        ranks = np.arange(len(self.kept), dtype=np.int64)
+        self.kept_positions = ranks + np.searchsorted(insert_at, ranks, side="right")
+        self.added = insert_at + np.arange(len(insert_at), dtype=np.int64)
+        self.count = len(self.kept) + len(insert_at)
+        self.old_to_new = np.full(len(keep), -1, dtype=np.int64)
+        self.old_to_new[self.kept] = self.kept_positions
+
+        # Survivor ranks where a run of consecutive old items breaks or an insertion happens
+        breaks = set((np.flatnonzero(np.diff(self.kept) != 1) + 1).tolist())
+        breaks.update(insert_at.tolist())
+        breaks.update((0, len(self.kept)))
+        bounds = sorted(breaks)
+        self.pieces: List[Tuple[bool, int, int]] = []
+        inserted = 0
+        for start, end in zip(bounds, bounds[1:]):
+            inserted = self._insert_before(start, insert_at, inserted)
+            self.pieces.append((True, int(self.kept[start]), int(self.kept[end - 1]) + 1))
+        self._insert_before(len(self.kept) + 1, insert_at, inserted)
+
+    def _insert_before(self, rank: int, insert_at: np.ndarray, inserted: int) -> int:
+        end = int(np.searchsorted(insert_at, rank, side="right"))
+        if end > inserted:
+            self.pieces.append((False, inserted, end))
+        return end
+
+    def gather(self, old, new, dtype) -> np.ndarray:
+        """Per-item values after the splice: survivors' from ``old``, inserted ones from ``new``"""
+        result = np.empty(self.count, dtype=dtype)
+        result[self.kept_positions] = np.asarray(old)[self.kept]
+        result[self.added] = np.asarray(new, dtype=dtype)
+        return result
+
+
+def splice_strings(values: Sequence[str], splice: Splice, new_values: List[str]) -> Sequence[str]:
+    """Apply ``splice`` to a list of strings or a ``StringColumn``, keeping its kind
+
+    Runs of surviving strings in a column are copied as raw byte slices.
+    """
+    if not hasattr(values, "buffer"):
+        merged: List[str] = []
+        for from_old, start, end in splice.pieces:
+            merged.extend(values[start:end] if from_old else new_values[start:end])
+        return merged
+    encoded = [value.encode("utf-8") for value in new_values]
+    old_offsets = np.asarray(values.offsets, dtype=np.int64)
+    lengths = splice.gather(np.diff(old_offsets), [len(value) for value in encoded], np.int64)
+    offsets = np.zeros(splice.count + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    buffer = b"".join(
+        values.buffer[old_offsets[start]:old_offsets[end]] if from_old else b"".join(encoded[start:end])
+        for from_old, start, end in splice.pieces
+    )
+    return type(values)(buffer, to_array("I", offsets))
+
+
+def merge_vocab(vocab: Sequence[str], new_vocab: Sequence[str]) -> Tuple[Splice, np.ndarray, List[str]]:
+    """Merge the sorted ``new_vocab`` into the sorted ``vocab``
+
+    Returns the splice adding the missing terms to ``vocab``, the merged
+    slot of every term of ``new_vocab`` and the missing terms themselves.
+    """
+    found = []
+    missing: List[str] = []
+    insert_at = []
+    for term in new_vocab:
+        slot = bisect_left(vocab, term)
+        if slot < len(vocab) and vocab[slot] == term:
+            found.append(slot)
+        else:
+            found.append(-1 - len(missing))
+            missing.append(term)
+            insert_at.append(slot)
+    splice = Splice(np.ones(len(vocab), dtype=bool), insert_at)
+    found = np.asarray(found, dtype=np.int64)
+    existing = found >= 0
+    slots = np.empty(len(found), dtype=np.int64)
+    slots[existing] = splice.old_to_new[found[existing]]
+    slots[~existing] = splice.added[-1 - found[~existing]]
+    return splice, slots, missing
+
+
+def splice_postings(
+    docs: Splice,
+    terms: Splice,
+    term_slots: np.ndarray,
+    offsets: Sequence[int],
+    doc_ids: Sequence[int],
+    new_offsets: Sequence[int],
+    new_doc_ids: Sequence[int],
+    values: Sequence[float] = None,
+    new_values: Sequence[float] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Merge the postings of the inserted docs into an inverted index
+
+    ``offsets``/``doc_ids``/``values`` are the existing postings, ``docs``
+    the splice of the corpus and ``terms`` that of the vocabulary. The new
+    postings index the inserted docs by their rank among them and their own
+    sorted vocabulary, whose merged slots are ``term_slots``. Postings of
+    removed docs are dropped; terms left without any keep an empty list.
+    Returns the merged offsets, doc ids and values (``None`` without values).
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    term_of = np.repeat(terms.old_to_new, np.diff(offsets))
+    mapped = docs.old_to_new[np.asarray(doc_ids, dtype=np.int64)]
+    live = mapped >= 0
+    term_of, mapped = term_of[live], mapped[live]
+
+    new_offsets = np.asarray(new_offsets, dtype=np.int64)
+    new_terms = np.repeat(term_slots, np.diff(new_offsets))
+    new_docs = docs.added[np.asarray(new_doc_ids, dtype=np.int64)]
+    # Both sides are sorted by (term, doc), so the new postings are inserted in place
+    at = np.searchsorted(term_of * docs.count + mapped, new_terms * docs.count + new_docs)
+    term_of = np.insert(term_of, at, new_terms)
+    merged_docs = np.insert(mapped, at, new_docs)
+    merged_values = None
+    if values is not None:
+        merged_values = np.insert(np.asarray(values)[live], at, np.asarray(new_values, dtype=np.float32))
+
+    merged_offsets = np.zeros(terms.count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_of, minlength=terms.count), out=merged_offsets[1:])
+    return merged_offsets, merged_docs, merged_values
@@ -0,0 +1,74 @@
+"""
+Indexed keyset queries and NDJSON export over the status_checks collection
+"""
+
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import DESCENDING
+
+from pagination import decode_cursor, encode_cursor
+from responses import dumps
+
+# Newest first; _id breaks ties between checks recorded in the same millisecond
+SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+PROJECTION = {"_id": 1, "id": 1, "client_name": 1, "timestamp": 1}
+EXPORT_BATCH_SIZE = 1000
+
+
+async def ensure_status_indexes(collection) -> None:
+    """Create the indexes backing the listing sort, with and without a client filter"""
+    await collection.create_index(SORT, name="timestamp_id")
+    await collection.create_index([("client_name", 1)] + SORT, name="client_name_timestamp_id")
+
+
+def status_filter(
+    client_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build the Mongo filter for the given filters and the page after ``cursor``"""
+    query: Dict[str, Any] = {}
+    if client_name:
+        query["client_name"] = client_name
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    if cursor:
+        timestamp, object_id = _decode_position(cursor)
+        after = {"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": object_id}},
+        ]}
+        query = {"$and": [query, after]} if query else after
+    return query
+
+
+def next_cursor(document: Dict[str, Any]) -> str:
+    return encode_cursor({"t": document["timestamp"].isoformat(), "o": str(document["_id"])})
+
+
+def _decode_position(cursor: str) -> Tuple[datetime, ObjectId]:
+    position = decode_cursor(cursor, "t", "o")
+    try:
+        return datetime.fromisoformat(position["t"]), ObjectId(position["o"])
+    except (TypeError, ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def to_status(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a stored document like ``StatusCheck`` without re-validating it"""
+    return {"id": document.get("id"), "client_name": document.get("client_name"), "timestamp": document.get("timestamp")}
+
+
+async def export_ndjson(cursor) -> AsyncIterator[bytes]:
+    """Yield one JSON line per document straight from a Motor cursor"""
+    async for document in cursor:
+        yield dumps(to_status(document)) + b"\n"
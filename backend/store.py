@@ -0,0 +1,328 @@
+"""
+Compact column-oriented storage for the idiom corpus
+"""
+
+import hashlib
+from array import array
+from bisect import bisect_left
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+from splice import KeptView, Splice, splice_strings, to_array
+
+ID_DIGEST_SIZE = 8
+
+IDIOM_FIELDS = (
+    "id", "idiom", "meaning", "example", "related_idiom",
+    "difficulty_level", "category", "origin",
+)
+TEXT_FIELDS = ("idiom", "meaning", "example", "related_idiom", "origin")
+CODED_FIELDS = ("difficulty_level", "category")
+
+
+def normalize_idiom(text: str) -> str:
+    """Normalize idiom text for identity: casefolded words, no punctuation"""
+    return " ".join(tokenize(text))
+
+
+def content_id(*parts: str) -> str:
+    """Hash the given normalized parts into a short hex id"""
+    digest = hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=ID_DIGEST_SIZE)
+    return digest.hexdigest()
+
+
+def parse_id(idiom_id: str) -> Optional[int]:
+    """The integer behind a hex id, or ``None`` if it is not one"""
+    if len(idiom_id) != ID_DIGEST_SIZE * 2:
+        return None
+    try:
+        return int(idiom_id, 16)
+    except ValueError:
+        return None
+
+
+def carried_id(entry: dict) -> Optional[str]:
+    """The id an entry already carries, as MongoDB documents do, if it is a valid one"""
+    idiom_id = entry.get("id")
+    return idiom_id if isinstance(idiom_id, str) and parse_id(idiom_id) is not None else None
+
+
+def assign_ids(entries: list) -> list:
+    """Return a stable, content-addressed id for every raw idiom entry
+
+    The id only depends on the normalized idiom text, so it survives
+    restarts and matches across workers. Entries that normalize to the same
+    idiom fall back to hashing the meaning too. An entry carrying a valid
+    id keeps it: which of two such idioms got the plain hash depends on
+    the order they were first seen in, which a reload does not preserve.
+    """
+    carried = [carried_id(entry) for entry in entries]
+    ids = []
+    assigned = set()
+    # Hashes other entries carry are taken even before those entries are reached
+    seen = set(idiom_id for idiom_id in carried if idiom_id is not None)
+    for entry, idiom_id in zip(entries, carried):
+        if idiom_id is None or idiom_id in assigned:
+            key = normalize_idiom(entry["idiom"])
+            idiom_id = content_id(key)
+            if idiom_id in seen:
+                idiom_id = content_id(key, normalize_idiom(entry.get("meaning", "")))
+        seen.add(idiom_id)
+        assigned.add(idiom_id)
+        ids.append(idiom_id)
+    return ids
+
+
+def validate_entry(entry: Any, position: int) -> None:
+    """Cheap structural check replacing per-record pydantic validation"""
+    if not isinstance(entry, dict):
+        raise ValueError(f"Idiom #{position} is not an object")
+    for field in TEXT_FIELDS + CODED_FIELDS:
+        if not isinstance(entry.get(field), str):
+            raise ValueError(f"Idiom #{position} has a missing or non-string '{field}'")
+
+
+class StringColumn:
+    """Strings packed into one UTF-8 buffer, sliced by an offsets array
+
+    One buffer plus four bytes per value replaces a full ``str`` object per
+    value; strings are decoded on access.
+    """
+
+    __slots__ = ("buffer", "offsets")
+
+    def __init__(self, buffer, offsets: Sequence[int]):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> "StringColumn":
+        offsets = array("I", [0])
+        chunks = []
+        total = 0
+        for value in values:
+            encoded = value.encode("utf-8")
+            chunks.append(encoded)
+            total += len(encoded)
+            offsets.append(total)
+        return cls(b"".join(chunks), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        return str(self.buffer[self.offsets[position]:self.offsets[position + 1]], "utf-8")
+
+
+class SortKeys:
+    """``(normalized idiom, id)`` per position, the order the store is kept in"""
+
+    __slots__ = ("_store",)
+
+    def __init__(self, store: "IdiomStore"):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __getitem__(self, position: int) -> tuple:
+        return self._store.keys[position], self._store.id_at(position)
+
+
+class IdiomRow:
+    """Attribute view of one stored idiom, built on demand
+
+    Exposes the same attribute names as the ``Idiom`` model so index
+    builders and projections work unchanged.
+    """
+
+    __slots__ = ("_store", "_position")
+
+    def __init__(self, store: "IdiomStore", position: int):
+        self._store = store
+        self._position = position
+
+    def __getattr__(self, name: str) -> str:
+        return self._store.value(self._position, name)
+
+
+class IdiomStore:
+    """Column-oriented idiom records sorted by ``(normalized idiom, id)``
+
+    Text fields are ``StringColumn``s, category and difficulty are small
+    integer codes into interned value lists, and ids are 64-bit integers
+    with a sorted copy for binary-search lookups.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[int],
+        keys: StringColumn,
+        text_columns: Dict[str, StringColumn],
+        code_values: Dict[str, List[str]],
+        code_columns: Dict[str, Sequence[int]],
+        ids_sorted: Sequence[int],
+        ids_sorted_positions: Sequence[int],
+    ):
+        self.ids = ids
+        self.keys = keys
+        self.text_columns = text_columns
+        self.code_values = code_values
+        self.code_columns = code_columns
+        self.ids_sorted = ids_sorted
+        self.ids_sorted_positions = ids_sorted_positions
+        self.sort_keys = SortKeys(self)
+
+    @classmethod
+    def from_entries(cls, entries: List[dict]) -> "IdiomStore":
+        """Validate raw idiom dicts and pack them into columns"""
+        for position, entry in enumerate(entries):
+            validate_entry(entry, position)
+        hex_ids = assign_ids(entries)
+        keys = [normalize_idiom(entry["idiom"]) for entry in entries]
+        order = sorted(range(len(entries)), key=lambda i: (keys[i], hex_ids[i]))
+
+        code_values: Dict[str, List[str]] = {}
+        code_columns: Dict[str, array] = {}
+        for field in CODED_FIELDS:
+            interned: Dict[str, int] = {}
+            codes = array("H")
+            for i in order:
+                value = entries[i][field]
+                code = interned.get(value)
+                if code is None:
+                    code = interned[value] = len(interned)
+                codes.append(code)
+            code_values[field] = list(interned)
+            code_columns[field] = codes
+
+        ids = array("Q", (int(hex_ids[i], 16) for i in order))
+        id_order = sorted(range(len(ids)), key=ids.__getitem__)
+        return cls(
+            ids=ids,
+            keys=StringColumn.from_strings(keys[i] for i in order),
+            text_columns={
+                field: StringColumn.from_strings(entries[i][field] for i in order)
+                for field in TEXT_FIELDS
+            },
+            code_values=code_values,
+            code_columns=code_columns,
+            ids_sorted=array("Q", (ids[i] for i in id_order)),
+            ids_sorted_positions=array("I", id_order),
+        )
+
+    def apply_delta(self, entries: List[dict], removed_ids: Iterable[str]) -> Tuple["IdiomStore", Splice]:
+        """Return a store with ``entries`` upserted and ``removed_ids`` dropped
+
+        An entry replaces the record with the same content-addressed id.
+        Only the new entries are validated and encoded; the other records
+        are copied column by column. The returned ``Splice`` maps the doc
+        ids of this store to those of the new one for the indexes.
+        """
+        for position, entry in enumerate(entries):
+            validate_entry(entry, position)
+        removed_ids = list(removed_ids)
+        hex_ids = self.delta_ids(entries, removed_ids)
+        keys = [normalize_idiom(entry["idiom"]) for entry in entries]
+        order = sorted(range(len(entries)), key=lambda i: (keys[i], hex_ids[i]))
+
+        keep = np.ones(len(self), dtype=bool)
+        for idiom_id in chain(removed_ids, hex_ids):
+            position = self.find(idiom_id)
+            if position is not None:
+                keep[position] = False
+        survivors = KeptView(self.sort_keys, np.flatnonzero(keep))
+        splice = Splice(keep, [bisect_left(survivors, (keys[i], hex_ids[i])) for i in order])
+
+        code_values: Dict[str, List[str]] = {}
+        code_columns: Dict[str, array] = {}
+        for field in CODED_FIELDS:
+            values = list(self.code_values[field])
+            interned = {value: code for code, value in enumerate(values)}
+            codes = []
+            for i in order:
+                value = entries[i][field]
+                code = interned.get(value)
+                if code is None:
+                    code = interned[value] = len(values)
+                    values.append(value)
+                codes.append(code)
+            code_values[field] = values
+            code_columns[field] = to_array("H", splice.gather(self.code_columns[field], codes, np.uint16))
+
+        ids = splice.gather(self.ids, [int(hex_ids[i], 16) for i in order], np.uint64)
+        id_order = np.argsort(ids, kind="stable")
+        store = IdiomStore(
+            ids=to_array("Q", ids),
+            keys=splice_strings(self.keys, splice, [keys[i] for i in order]),
+            text_columns={
+                field: splice_strings(self.text_columns[field], splice, [entries[i][field] for i in order])
+                for field in TEXT_FIELDS
+            },
+            code_values=code_values,
+            code_columns=code_columns,
+            ids_sorted=to_array("Q", ids[id_order]),
+            ids_sorted_positions=to_array("I", id_order),
+        )
+        return store, splice
+
+    def delta_ids(self, entries: List[dict], removed_ids: List[str]) -> List[str]:
+        """``assign_ids`` for delta entries, resolved against the records already stored
+
+        An entry keeps the id it carries, as MongoDB documents do. Otherwise
+        an idiom normalizing like a different stored one that stays falls
+        back to hashing the meaning too, as it would in the full corpus.
+        """
+        removed = set(removed_ids)
+        ids = []
+        seen = set()
+        for entry in entries:
+            idiom_id = carried_id(entry)
+            if idiom_id is None:
+                key = normalize_idiom(entry["idiom"])
+                idiom_id = content_id(key)
+                position = None if idiom_id in removed else self.find(idiom_id)
+                if idiom_id in seen or (position is not None and self.value(position, "idiom") != entry["idiom"]):
+                    idiom_id = content_id(key, normalize_idiom(entry.get("meaning", "")))
+            seen.add(idiom_id)
+            ids.append(idiom_id)
+        return ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, position: int) -> IdiomRow:
+        if not 0 <= position < len(self.ids):
+            raise IndexError(position)
+        return IdiomRow(self, position)
+
+    def id_at(self, position: int) -> str:
+        return format(self.ids[position], f"0{ID_DIGEST_SIZE * 2}x")
+
+    def value(self, position: int, field: str) -> str:
+        """Decode one field of one record"""
+        if field == "id":
+            return self.id_at(position)
+        column = self.text_columns.get(field)
+        if column is not None:
+            return column[position]
+        codes = self.code_columns.get(field)
+        if codes is not None:
+            return self.code_values[field][codes[position]]
+        raise AttributeError(field)
+
+    def to_dict(self, position: int) -> Dict[str, str]:
+        return {field: self.value(position, field) for field in IDIOM_FIELDS}
+
+    def find(self, idiom_id: str) -> Optional[int]:
+        """Return the position of ``idiom_id`` or ``None``"""
+        key = parse_id(idiom_id)
+        if key is None:
+            return None
+        slot = bisect_left(self.ids_sorted, key)
+        if slot < len(self.ids_sorted) and self.ids_sorted[slot] == key:
+            return self.ids_sorted_positions[slot]
+        return None
@@ -0,0 +1,169 @@
+"""
+Sorted-array prefix index for idiom autocomplete
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+from splice import KeptView, Splice, splice_strings, to_array
+
+DIFFICULTY_ORDER = {"easy": 0, "medium": 1, "hard": 2}
+NO_RANK = (1 << 64) - 1
+# The low bits of a rank hold the doc id
+DOC_MASK = (1 << 32) - 1
+
+
+def normalize_prefix(prefix: str) -> str:
+    """Normalize typed text like idiom keys, keeping a trailing word break"""
+    normalized = " ".join(tokenize(prefix))
+    if normalized and prefix[-1:].isspace():
+        normalized += " "
+    return normalized
+
+
+def entry_rank(word_position: int, difficulty: str, category: str, length: int, doc_id: int) -> int:
+    """Pack the static suggestion order into one integer, lower is better
+
+    Matches at the start of the idiom come first, then easier idioms, then
+    the "Popular" category, then shorter idioms, then corpus order.
+    """
+    return (
+        (min(word_position, 1) << 62)
+        | (DIFFICULTY_ORDER.get(difficulty.casefold(), 3) << 59)
+        | ((category.casefold() != "popular") << 58)
+        | (min(length, 0xFF) << 32)
+        | doc_id
+    )
+
+
+def _entries(store, doc_ids: Iterable[int]) -> List[Tuple[str, int, int]]:
+    """Sorted ``(suffix, rank, doc_id)`` for every word-start suffix of the given docs"""
+    items = []
+    for doc_id in doc_ids:
+        key = store.keys[doc_id]
+        row = store[doc_id]
+        difficulty, category = row.difficulty_level, row.category
+        start = 0
+        for position, word in enumerate(key.split(" ")):
+            items.append((key[start:], entry_rank(position, difficulty, category, len(key), doc_id), doc_id))
+            start += len(word) + 1
+    items.sort()
+    return items
+
+
+def _segment_tree(ranks: np.ndarray) -> array:
+    """Best-ranked entry per node, built level by level; ``ranks`` ends with the ``NO_RANK`` sentinel"""
+    count = len(ranks) - 1
+    size = 1
+    while size < max(count, 1):
+        size *= 2
+    tree = np.full(2 * size, count, dtype=np.int64)
+    tree[size:size + count] = np.arange(count)
+    level = size
+    while level > 1:
+        left, right = tree[level:2 * level:2], tree[level + 1:2 * level:2]
+        tree[level // 2:level] = np.where(ranks[left] <= ranks[right], left, right)
+        level //= 2
+    return to_array("I", tree)
+
+
+class SuggestIndex:
+    """Every word-start suffix of every normalized idiom, sorted
+
+    ``entries[i]`` is a suffix such as "blue moon" for "once in a blue
+    moon", ``entry_docs[i]`` its doc id and ``ranks[i]`` its static order.
+    A prefix selects a contiguous range of entries; ``tree`` is a segment
+    tree of the best-ranked entry per node, so the top-k of any range is
+    extracted in O(k log n) without scanning it.
+    """
+
+    def __init__(self, entries: Sequence[str], entry_docs: Sequence[int], ranks: Sequence[int], tree: Sequence[int]):
+        self.entries = entries
+        self.entry_docs = entry_docs
+        self.ranks = ranks
+        self.tree = tree
+        self.size = len(tree) // 2
+
+    @classmethod
+    def build(cls, store) -> "SuggestIndex":
+        items = _entries(store, range(len(store)))
+        ranks = array("Q", (rank for _, rank, _ in items))
+        ranks.append(NO_RANK)
+        return cls(
+            [text for text, _, _ in items],
+            array("I", (doc_id for _, _, doc_id in items)),
+            ranks,
+            _segment_tree(np.asarray(ranks)),
+        )
+
+    def apply(self, store, splice: Splice) -> "SuggestIndex":
+        """Add the entries of the docs inserted by ``splice`` and drop those of removed docs
+
+        Ranks end with the doc id, so remapping the surviving entries to
+        their new doc ids keeps them in the same order.
+        """
+        items = _entries(store, splice.added.tolist())
+        docs = splice.old_to_new[np.asarray(self.entry_docs, dtype=np.int64)]
+        ranks = (np.asarray(self.ranks[:-1], dtype=np.uint64) & ~np.uint64(DOC_MASK)) | docs.astype(np.uint64)
+        keep = docs >= 0
+        kept = np.flatnonzero(keep)
+        texts = KeptView(self.entries, kept)
+        kept_ranks = ranks[kept]
+        insert_at = []
+        for text, rank, _ in items:
+            lo = bisect_left(texts, text)
+            hi = bisect_right(texts, text, lo=lo)
+            insert_at.append(lo + int(np.searchsorted(kept_ranks[lo:hi], rank)))
+        entries = Splice(keep, insert_at)
+
+        ranks = np.append(entries.gather(ranks, [rank for _, rank, _ in items], np.uint64), np.uint64(NO_RANK))
+        return SuggestIndex(
+            splice_strings(self.entries, entries, [text for text, _, _ in items]),
+            to_array("I", entries.gather(docs, [doc_id for _, _, doc_id in items], np.int64)),
+            to_array("Q", ranks),
+            _segment_tree(ranks),
+        )
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[int]:
+        """Return up to ``limit`` distinct doc ids whose idiom has a word starting with ``prefix``"""
+        normalized = normalize_prefix(prefix)
+        if not normalized or limit <= 0:
+            return []
+        lo = bisect_left(self.entries, normalized)
+        hi = bisect_left(self.entries, normalized + "\U0010ffff", lo=lo)
+        if lo >= hi:
+            return []
+
+        heap = []
+        left, right = lo + self.size, hi + self.size
+        while left < right:
+            if left & 1:
+                heap.append((self.ranks[self.tree[left]], left))
+                left += 1
+            if right & 1:
+                right -= 1
+                heap.append((self.ranks[self.tree[right]], right))
+            left //= 2
+            right //= 2
+        heapq.heapify(heap)
+
+        results: List[int] = []
+        seen = set()
+        while heap and len(results) < limit:
+            rank, node = heapq.heappop(heap)
+            if node >= self.size:
+                doc_id = self.entry_docs[node - self.size]
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    results.append(doc_id)
+                continue
+            for child in (2 * node, 2 * node + 1):
+                child_rank = self.ranks[self.tree[child]]
+                if child_rank != NO_RANK:
+                    heapq.heappush(heap, (child_rank, child))
+        return results
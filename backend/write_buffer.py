@@ -0,0 +1,156 @@
+"""
+Write-behind buffering of MongoDB inserts into batched insert_many calls
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BufferFull(Exception):
+    """Raised when a document could not be queued before the put timeout"""
+
+
+class WriteBehindBuffer:
+    """Bounded in-process queue of documents flushed with ``insert_many``
+
+    A background task collects queued documents into batches and flushes
+    one as soon as it reaches ``max_batch`` documents or ``max_delay``
+    seconds after its first document arrived. When ``max_pending``
+    documents are waiting, ``put`` waits up to ``put_timeout`` seconds for
+    room and then raises ``BufferFull``, so a slow database pushes back on
+    callers instead of growing memory.
+    """
+
+    def __init__(
+        self,
+        collection,
+        max_batch: int = 500,
+        max_delay: float = 0.05,
+        max_pending: int = 10_000,
+        put_timeout: float = 1.0,
+    ):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.flushed_documents = 0
+        self.failed_documents = 0
+        self.rejected_documents = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.last_batch_size = 0
+
+    def start(self) -> None:
+        """Start the flusher on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, document: Dict[str, Any]) -> None:
+        """Queue ``document`` for insertion, waiting briefly if the buffer is full"""
+        if self._task is None:
+            raise RuntimeError("Write buffer is not running")
+        try:
+            await asyncio.wait_for(self._queue.put(document), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_documents += 1
+            raise BufferFull() from None
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Flush everything queued so far and stop the flusher, waiting at most ``timeout`` seconds
+
+        When the database is too slow to drain the queue in time the flusher
+        is cancelled and the documents still queued are dropped.
+        """
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.error(f"Write buffer did not drain within {timeout}s, dropping {self.depth} queued documents")
+        self._task = None
+
+    async def _drain(self) -> None:
+        # Waits for room when the queue is full, so it must be bounded by the caller
+        await self._queue.put(_STOP)
+        await self._task
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.depth,
+            "max_pending": self.max_pending,
+            "flushes": self.flushes,
+            "flushed_documents": self.flushed_documents,
+            "failed_documents": self.failed_documents,
+            "rejected_documents": self.rejected_documents,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            batch: List[Dict[str, Any]] = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    document = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        document = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if document is _STOP:
+                    stopping = True
+                    break
+                batch.append(document)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            inserted = e.details.get("nInserted", 0)
+            self.flushed_documents += inserted
+            self.failed_documents += len(batch) - inserted
+            logger.error(f"Flushing buffered documents failed for {len(batch) - inserted} of {len(batch)}")
+        except Exception:
+            self.failed_documents += len(batch)
+            logger.exception(f"Flushing {len(batch)} buffered documents failed")
+        else:
+            self.flushed_documents += len(batch)
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.last_batch_size = len(batch)
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.total_flush_seconds += elapsed
@@ -51,6 +51,8 @@ function App() {
   const [modalOpen, setModalOpen] = useState(false);
   const [categories, setCategories] = useState([]);
   const [difficulties, setDifficulties] = useState([]);
+  const [categoryCounts, setCategoryCounts] = useState({});
+  const [difficultyCounts, setDifficultyCounts] = useState({});
   const [stats, setStats] = useState({});
   const [activeSection, setActiveSection] = useState('idioms');
   const [contactForm, setContactForm] = useState({
@@ -109,6 +111,8 @@ function App() {
       setFilteredIdioms(idiomsRes.data);
       setCategories(categoriesRes.data.categories);
       setDifficulties(difficultiesRes.data.difficulties);
+      setCategoryCounts(categoriesRes.data.counts || {});
+      setDifficultyCounts(difficultiesRes.data.counts || {});
       setStats(statsRes.data);
     } catch (error) {
       console.error('Error loading data:', error);
@@ -511,7 +515,9 @@ function App() {
                   >
                     <option value="">All Categories</option>
                     {categories.map(category => (
-                      <option key={category} value={category}>{category}</option>
+                      <option key={category} value={category}>
+                        {category}{categoryCounts[category] !== undefined ? ` (${categoryCounts[category]})` : ''}
+                      </option>
                     ))}
                   </select>
                 </motion.div>
@@ -531,7 +537,9 @@ function App() {
                   >
                     <option value="">All Levels</option>
                     {difficulties.map(difficulty => (
-                      <option key={difficulty} value={difficulty}>{difficulty}</option>
+                      <option key={difficulty} value={difficulty}>
+                        {difficulty}{difficultyCounts[difficulty] !== undefined ? ` (${difficultyCounts[difficulty]})` : ''}
+                      </option>
                     ))}
                   </select>
                 </motion.div>
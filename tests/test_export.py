@@ -0,0 +1,27 @@
+import json
+
+from corpus import CorpusSnapshot
+from export import ndjson_chunks
+from responses import encode_record
+from store import IDIOM_FIELDS
+
+ENTRIES = [
+    {
+        "idiom": f"Idiom {i} — «déjà vu»",
+        "meaning": f"Meaning {i} with \"quotes\" and a tab\t",
+        "example": "Ça va, 😀",
+        "related_idiom": "",
+        "difficulty_level": "Easy",
+        "category": "Popular",
+        "origin": "Unknown",
+    }
+    for i in range(5)
+]
+
+
+def test_ndjson_lines_are_the_payload_records():
+    corpus = CorpusSnapshot.from_entries(ENTRIES)
+    doc_ids = range(len(corpus))
+    lines = b"".join(ndjson_chunks(corpus.idioms, doc_ids, IDIOM_FIELDS)).splitlines()
+    assert lines == [encode_record(corpus.idioms, corpus.payload, doc_id) for doc_id in doc_ids]
+    assert [json.loads(line) for line in lines] == [corpus.idioms.to_dict(doc_id) for doc_id in doc_ids]
@@ -0,0 +1,145 @@
+import asyncio
+
+import mongomock
+import pytest
+
+from mongo_idioms import MongoIdiomSource
+from store import IdiomStore, assign_ids
+
+
+class AsyncCursor:
+    """The part of Motor's cursor API MongoIdiomSource uses, over a mongomock cursor"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length):
+        return list(self.cursor)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.cursor:
+            yield document
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.db = mongomock.MongoClient().db
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.db[name])
+
+
+def entry(idiom, meaning="A meaning", category="Popular"):
+    return {
+        "idiom": idiom,
+        "meaning": meaning,
+        "example": f"An example of {idiom.lower()}.",
+        "related_idiom": "",
+        "difficulty_level": "Easy",
+        "category": category,
+        "origin": "Unknown",
+    }
+
+
+ENTRIES = [entry(f"Idiom number {i}", f"Meaning {i}") for i in range(10)]
+
+
+@pytest.fixture
+def source():
+    return MongoIdiomSource(AsyncDatabase())
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_replace_all_then_load_returns_every_idiom(source):
+    version = run(source.replace_all(ENTRIES))
+    loaded_version, loaded = run(source.load())
+    assert loaded_version == version
+    assert sorted(idiom["id"] for idiom in loaded) == sorted(assign_ids(ENTRIES))
+    assert {idiom["meaning"] for idiom in loaded} == {e["meaning"] for e in ENTRIES}
+
+
+def test_replace_all_with_the_same_idioms_keeps_the_version(source):
+    version = run(source.replace_all(ENTRIES))
+    assert run(source.replace_all(list(ENTRIES))) == version
+    assert run(source.version()) == version
+
+
+def test_first_write_records_no_changes(source):
+    version = run(source.replace_all(ENTRIES))
+    assert run(source.changes_since(version)) is None
+
+
+def test_changes_since_lists_upserts_and_removals(source):
+    base = run(source.replace_all(ENTRIES))
+    updated = [entry(e["idiom"], "Changed") if i == 0 else e for i, e in enumerate(ENTRIES[:-1])]
+    updated.append(entry("A brand new idiom"))
+    version = run(source.replace_all(updated))
+    assert version != base
+    assert run(source.version()) == version
+
+    changed_version, upserted, removed = run(source.changes_since(base))
+    assert changed_version == version
+    ids = assign_ids(updated)
+    assert sorted(idiom["id"] for idiom in upserted) == sorted([ids[0], ids[-1]])
+    assert next(idiom for idiom in upserted if idiom["id"] == ids[0])["meaning"] == "Changed"
+    assert removed == [assign_ids(ENTRIES)[-1]]
+    assert len(run(source.load())[1]) == len(updated)
+
+
+def test_changes_since_another_base_is_none(source):
+    run(source.replace_all(ENTRIES))
+    run(source.replace_all(ENTRIES[:-1]))
+    assert run(source.changes_since("some other version")) is None
+
+
+def test_rewriting_most_idioms_records_no_changes(source):
+    base = run(source.replace_all(ENTRIES))
+    run(source.replace_all([entry(e["idiom"], "Changed") for e in ENTRIES]))
+    assert run(source.changes_since(base)) is None
+
+
+def served_ids(store):
+    return {store.id_at(position): store.value(position, "meaning") for position in range(len(store))}
+
+
+def test_colliding_idioms_keep_their_stored_ids(source):
+    # The second one's fallback id sorts before the first one's, so MongoDB returns them swapped
+    pair = [entry("spill the beans!", "To drop a can of beans"), entry("Spill the beans", "To reveal a secret")]
+    base = run(source.replace_all(ENTRIES + pair))
+    stored = dict(zip(assign_ids(ENTRIES + pair), (e["meaning"] for e in ENTRIES + pair)))
+    store = IdiomStore.from_entries(run(source.load())[1])
+    assert served_ids(store) == stored
+
+    run(source.replace_all(ENTRIES + pair[1:]))
+    _, upserted, removed = run(source.changes_since(base))
+    updated, _ = store.apply_delta(upserted, removed)
+    assert served_ids(updated) == served_ids(IdiomStore.from_entries(run(source.load())[1]))
+    assert "To drop a can of beans" not in served_ids(updated).values()
@@ -0,0 +1,105 @@
+import base64
+
+import pytest
+from fastapi import HTTPException, Response
+from fastapi.testclient import TestClient
+
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate_ordered, paginate_ranked
+
+SORT_KEYS = [(f"key {i:02d}", f"{i:016x}") for i in range(10)]
+
+
+def walk(paginate, items, limit):
+    pages, cursor = [], None
+    while True:
+        response = Response()
+        page = paginate(items, SORT_KEYS, cursor, limit, response)
+        pages.append(page)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    position = {"k": "break the ice", "i": "00ff", "s": 1.5}
+    assert decode_cursor(encode_cursor(position), "k", "i", "s") == position
+
+
+RANKED = [(i, 10.0 - i) for i in range(10)]
+
+
+@pytest.mark.parametrize("paginate, items, cursor", [
+    (paginate_ordered, range(10), "not a cursor!"),
+    (paginate_ordered, range(10), base64.urlsafe_b64encode(b"[1, 2]").decode()),
+    (paginate_ordered, range(10), encode_cursor({"k": "x"})),
+    (paginate_ordered, range(10), encode_cursor({"k": 1, "i": 2})),
+    (paginate_ordered, range(10), encode_cursor({"k": "x", "i": None})),
+    (paginate_ranked, RANKED, encode_cursor({"s": "x", "k": "x", "i": "0"})),
+    (paginate_ranked, RANKED, encode_cursor({"s": True, "k": "x", "i": "0"})),
+    (paginate_ranked, RANKED, encode_cursor({"s": float("nan"), "k": "x", "i": "0"})),
+    (paginate_ranked, RANKED, encode_cursor({"s": 1.0, "k": ["x"], "i": "0"})),
+])
+def test_tampered_cursor_is_rejected(paginate, items, cursor):
+    with pytest.raises(HTTPException) as error:
+        paginate(items, SORT_KEYS, cursor, 3, Response())
+    assert error.value.status_code == 400
+
+
+def test_ordered_pages_cover_everything_once():
+    pages = walk(paginate_ordered, range(10), 3)
+    assert [list(page) for page in pages] == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+
+
+def test_last_page_has_no_next_cursor():
+    response = Response()
+    assert list(paginate_ordered(range(10), SORT_KEYS, None, 10, response)) == list(range(10))
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_empty_page_has_no_next_cursor():
+    response = Response()
+    assert paginate_ranked([], SORT_KEYS, None, 5, response) == []
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_ranked_pages_break_score_ties_by_sort_key():
+    ranked = sorted([(i, 2.0 if i % 2 else 1.0) for i in range(10)], key=lambda item: (-item[1], SORT_KEYS[item[0]]))
+    pages = walk(paginate_ranked, ranked, 4)
+    assert [doc_id for page in pages for doc_id in page] == [1, 3, 5, 7, 9, 0, 2, 4, 6, 8]
+
+
+def test_stale_cursor_resumes_after_its_position():
+    response = Response()
+    paginate_ordered(range(10), SORT_KEYS, None, 3, response)
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    # The idiom the cursor points at is gone; the next page starts after where it was
+    remaining = [doc_id for doc_id in range(10) if doc_id != 2]
+    assert list(paginate_ordered(remaining, SORT_KEYS, cursor, 3, Response())) == [3, 4, 5]
+
+
+@pytest.fixture(scope="module")
+def client():
+    import server
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("limit", [0, -1, 1001])
+def test_search_limit_out_of_bounds_is_rejected(client, limit):
+    response = client.get("/api/idioms/search", params={"q": "ice", "limit": limit})
+    assert response.status_code == 422
+
+
+def test_search_pages_through_results(client):
+    seen, cursor = [], None
+    while True:
+        params = {"category": "Popular", "limit": 5, "fields": "id"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/idioms/search", params=params)
+        assert response.status_code == 200
+        seen += [idiom["id"] for idiom in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    full = client.get("/api/idioms/search", params={"category": "Popular", "limit": 1000, "fields": "id"}).json()
+    assert seen == [idiom["id"] for idiom in full]
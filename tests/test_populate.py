@@ -0,0 +1,22 @@
+import populate_idioms
+from populate_idioms import CHUNKS_IN_FLIGHT, clean_rows
+
+
+def rows(count, pulled):
+    for i in range(count):
+        pulled.append(i)
+        yield [f"Idiom number {i}", f"Meaning {i}", f"Example {i}.", "", "Easy", "Popular", "Unknown"]
+
+
+def test_clean_rows_keeps_input_order_and_reads_a_bounded_window_ahead(monkeypatch):
+    monkeypatch.setattr(populate_idioms, "CHUNK_ROWS", 10)
+    monkeypatch.setattr(populate_idioms, "usable_cpus", lambda: 2)
+    pulled = []
+    chunks = clean_rows(rows(200, pulled), workers=2)
+
+    first = next(chunks)
+    # The chunks in flight, plus the one being filled when the window was full
+    assert len(pulled) <= 10 * (2 * CHUNKS_IN_FLIGHT + 1)
+
+    idioms = [line.split('"')[3] for cleaned, _ in [first, *chunks] for _, _, line, _, _ in cleaned]
+    assert idioms == [f"Idiom number {i}" for i in range(200)]
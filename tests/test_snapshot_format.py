@@ -0,0 +1,44 @@
+import pytest
+
+from corpus import CorpusSnapshot
+from snapshot_format import read_snapshot, write_snapshot
+
+
+def entry(idiom, meaning):
+    return {
+        "idiom": idiom,
+        "meaning": meaning,
+        "example": f"An example of {idiom.lower()}.",
+        "related_idiom": "",
+        "difficulty_level": "Easy",
+        "category": "Popular",
+        "origin": "Unknown",
+    }
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    corpus = CorpusSnapshot.from_entries([entry(f"Idiom number {i}", f"Meaning {i}") for i in range(20)])
+    corpus.payload.compress()
+    path = tmp_path / "idioms.snapshot"
+    size = write_snapshot(corpus, path, "source")
+    return corpus, path, size
+
+
+def test_snapshot_round_trip(snapshot):
+    corpus, path, _ = snapshot
+    mapped = read_snapshot(path, "source")
+    assert [mapped.idioms.to_dict(i) for i in range(len(mapped))] == [corpus.idioms.to_dict(i) for i in range(len(corpus))]
+    assert bytes(mapped.payload.variants[None]) == bytes(corpus.payload.variants[None])
+    assert read_snapshot(path, "another source") is None
+
+
+# The last section is padded to 8 bytes, so -9 cuts into its data
+@pytest.mark.parametrize("keep", [0, 4, 16, 40, 0.5, -9])
+def test_truncated_snapshot_is_rejected(snapshot, keep):
+    _, path, size = snapshot
+    keep = int(size * keep) if isinstance(keep, float) else keep % size
+    with open(path, "r+b") as f:
+        f.truncate(keep)
+    with pytest.raises(ValueError):
+        read_snapshot(path, "source")
@@ -0,0 +1,72 @@
+from corpus import CorpusSnapshot
+from store import IdiomStore, assign_ids
+
+
+def entry(idiom, meaning, category="General"):
+    return {
+        "idiom": idiom,
+        "meaning": meaning,
+        "example": f"They said '{idiom.lower()}' again.",
+        "related_idiom": "",
+        "difficulty_level": "Intermediate",
+        "category": category,
+        "origin": "",
+    }
+
+
+BASE = [
+    entry("Break the ice", "To start a conversation", "Social"),
+    entry("Bite the bullet", "To face something unpleasant"),
+    entry("Hit the sack", "To go to bed", "Daily life"),
+    entry("Spill the beans", "To reveal a secret"),
+]
+
+
+def records(corpus):
+    return [corpus.idioms.to_dict(position) for position in range(len(corpus))]
+
+
+def assert_same(corpus, expected):
+    assert records(corpus) == records(expected)
+    assert corpus.payload.variants[None] == expected.payload.variants[None]
+    assert corpus.version == expected.version
+
+
+def ids_of(entries):
+    return dict(zip((e["idiom"] for e in entries), assign_ids(entries)))
+
+
+def test_delta_matches_a_full_build():
+    updated = [BASE[0], entry("Bite the bullet", "To endure pain bravely"), BASE[3], entry("Cut corners", "To skimp")]
+    removed = [ids_of(BASE)["Hit the sack"]]
+    corpus = CorpusSnapshot.from_entries(BASE).apply_delta(updated[1:2] + updated[3:], removed)
+    assert_same(corpus, CorpusSnapshot.from_entries(updated))
+
+
+def test_colliding_idiom_does_not_replace_the_stored_one():
+    updated = BASE + [entry("Break the ice!", "To relieve tension", "Social")]
+    corpus = CorpusSnapshot.from_entries(BASE).apply_delta(updated[-1:], [])
+    assert_same(corpus, CorpusSnapshot.from_entries(updated))
+    assert {record["idiom"] for record in records(corpus)} >= {"Break the ice", "Break the ice!"}
+
+
+def test_colliding_idiom_with_a_new_meaning_replaces_its_old_id():
+    # Its id hashes the meaning too, so the delta removes the old one
+    base = BASE + [entry("Break the ice!", "To relieve tension", "Social")]
+    updated = base[:-1] + [entry("Break the ice!", "To ease an awkward silence", "Social")]
+    corpus = CorpusSnapshot.from_entries(base).apply_delta(updated[-1:], [assign_ids(base)[-1]])
+    assert_same(corpus, CorpusSnapshot.from_entries(updated))
+
+
+def test_colliding_idiom_takes_the_id_of_a_removed_one():
+    updated = BASE[1:] + [entry("Break the ice!", "To relieve tension", "Social")]
+    corpus = CorpusSnapshot.from_entries(BASE).apply_delta(updated[-1:], [ids_of(BASE)["Break the ice"]])
+    assert_same(corpus, CorpusSnapshot.from_entries(updated))
+
+
+def test_stored_id_is_kept():
+    store = IdiomStore.from_entries(BASE)
+    upsert = dict(BASE[1], meaning="To endure pain bravely", id=ids_of(BASE)["Bite the bullet"])
+    updated, _ = store.apply_delta([upsert], [])
+    assert len(updated) == len(BASE)
+    assert updated.to_dict(updated.find(upsert["id"]))["meaning"] == "To endure pain bravely"
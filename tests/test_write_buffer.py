@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from write_buffer import WriteBehindBuffer
+
+
+class SlowCollection:
+    def __init__(self, delay):
+        self.delay = delay
+        self.inserted = []
+
+    async def insert_many(self, documents, ordered=True):
+        await asyncio.sleep(self.delay)
+        self.inserted.extend(documents)
+
+
+def test_close_flushes_queued_documents():
+    collection = SlowCollection(0)
+
+    async def run():
+        buffer = WriteBehindBuffer(collection, max_batch=10, max_delay=0.01)
+        buffer.start()
+        for i in range(25):
+            await buffer.put({"n": i})
+        await buffer.close()
+
+    asyncio.run(run())
+    assert [document["n"] for document in collection.inserted] == list(range(25))
+
+
+def test_close_gives_up_when_the_database_stalls_with_a_full_queue():
+    collection = SlowCollection(60)
+
+    async def run():
+        buffer = WriteBehindBuffer(collection, max_batch=1, max_delay=0, max_pending=2)
+        buffer.start()
+        for i in range(3):
+            await buffer.put({"n": i})
+        started = time.perf_counter()
+        await buffer.close(timeout=0.2)
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 2
+    assert collection.inserted == []